@@ -0,0 +1,71 @@
+from __future__ import annotations
+import argparse
+import tempfile
+import time
+import numpy as np
+from tracemem.configs.numpy_index import NumpyCollection
+from tracemem.configs.quantization import QuantizedCollection
+from tracemem.storage.vector_store import MmapVectorStore
+
+
+def clustered_vectors(n: int, dim: int, clusters: int, spread: float, rng) -> np.ndarray:
+    # memories of one user cluster around a few topics, like real embeddings do
+    centers = rng.standard_normal((clusters, dim))
+    vectors = centers[rng.integers(clusters, size=n)] + spread * rng.standard_normal((n, dim))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+def recall(result_ids, truth_ids) -> float:
+    hits = sum(len(set(got) & set(want)) for got, want in zip(result_ids, truth_ids))
+    return hits / sum(len(want) for want in truth_ids)
+
+
+def run(collection, ids, vectors, queries, top_k):
+    collection.add(ids=ids, embeddings=vectors)
+    start = time.perf_counter()
+    result = collection.query(query_embeddings=queries, n_results=top_k)
+    elapsed = (time.perf_counter() - start) / len(queries)
+    return result["ids"], elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Recall vs. resident memory of quantized vector collections")
+    parser.add_argument("--vectors", type=int, default=20000, help="Vectors per collection")
+    parser.add_argument("--dim", type=int, default=1536, help="Embedding dimension")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries")
+    parser.add_argument("--top_k", type=int, default=10, help="Results per query")
+    parser.add_argument("--clusters", type=int, default=50, help="Topic clusters in the synthetic data")
+    parser.add_argument("--spread", type=float, default=0.6, help="Noise around each cluster center")
+    parser.add_argument("--rerank", type=int, nargs="+", default=[1, 2, 4, 8], help="Rerank factors to try")
+    parser.add_argument("--pq_subspaces", type=int, default=96, help="PQ sub-vectors")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vectors = clustered_vectors(args.vectors, args.dim, args.clusters, args.spread, rng)
+    queries = clustered_vectors(args.queries, args.dim, args.clusters, args.spread, rng)
+    ids = [str(i) for i in range(args.vectors)]
+
+    truth, exact_time = run(NumpyCollection("exact"), ids, vectors, queries, args.top_k)
+    print(f"{'mode':<6} {'rerank':>6} {'recall@' + str(args.top_k):>10} {'bytes/vec':>10} {'ms/query':>9}")
+    print(f"{'none':<6} {'-':>6} {1.0:>10.4f} {args.dim * 4:>10} {exact_time * 1000:>9.2f}")
+
+    with tempfile.TemporaryDirectory() as root:
+        store = MmapVectorStore(root, dtype="float32")
+        for mode in ("int8", "pq"):
+            for rerank in args.rerank:
+                name = f"{mode}_{rerank}"
+                collection = QuantizedCollection(name, None, mode, store,
+                                                 rerank=rerank,
+                                                 pq_subspaces=args.pq_subspaces,
+                                                 train_size=min(args.vectors, 2048))
+                result, elapsed = run(collection, ids, vectors, queries, args.top_k)
+                bytes_per_vector = collection.nbytes / args.vectors
+                print(f"{mode:<6} {rerank:>6} {recall(result, truth):>10.4f} "
+                      f"{bytes_per_vector:>10.0f} {elapsed * 1000:>9.2f}")
+                store.drop(name)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,8 +10,14 @@ from tqdm import tqdm
 def process_item(item_data):
     k, v = item_data
     local_results = defaultdict(list)
+    failed = 0
 
     for item in v:
+        # questions whose answering failed are counted, not scored as wrong answers
+        if item.get("error") or item.get("tracemem_answer") is None:
+            failed += 1
+            continue
+
         gt_answer = str(item["gt_answer"])
         pred_answer = str(item["tracemem_answer"])
         category = str(item["category"])
@@ -33,7 +39,7 @@ def process_item(item_data):
             }
         )
 
-    return local_results
+    return local_results, failed
 
 
 def main():
@@ -50,6 +56,7 @@ def main():
         data = json.load(f)
 
     results = defaultdict(list)
+    failed = 0
     results_lock = threading.Lock()
 
     # Use ThreadPoolExecutor with specified workers
@@ -57,8 +64,9 @@ def main():
         futures = [executor.submit(process_item, item_data) for item_data in data.items()]
 
         for future in tqdm(concurrent.futures.as_completed(futures), total=len(futures)):
-            local_results = future.result()
+            local_results, local_failed = future.result()
             with results_lock:
+                failed += local_failed
                 for k, items in local_results.items():
                     results[k].extend(items)
                     
@@ -69,6 +77,8 @@ def main():
         json.dump(results, f, indent=4)
 
     print(f"Results saved to {args.output_file}")
+    if failed:
+        print(f"{failed} questions failed to answer and were not scored")
 
 
 if __name__ == "__main__":
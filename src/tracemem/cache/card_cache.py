@@ -0,0 +1,75 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import json
+import os
+import threading
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class CardCache:
+    """
+    In-process LRU cache of personal cards.
+
+    Keeps the parsed card and the text it renders to in the search prompt,
+    keyed by path. An entry is reloaded when the file's mtime or size
+    changes, or after invalidate() (called when a card is rebuilt).
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, int, Any, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _load(self, card_path: str) -> Tuple[float, int, Any, str]:
+        stat = os.stat(card_path)
+        with open(card_path, 'r', encoding='utf-8') as f:
+            card = json.load(f)
+        # the search prompt has always embedded the Python rendering of the card
+        return stat.st_mtime, stat.st_size, card, f"{card}"
+
+    def _entry(self, card_path: str) -> Tuple[float, int, Any, str]:
+        stat = os.stat(card_path)
+        with self._lock:
+            entry = self._entries.get(card_path)
+            if entry is not None and entry[:2] == (stat.st_mtime, stat.st_size):
+                self._entries.move_to_end(card_path)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        entry = self._load(card_path)
+        with self._lock:
+            self._entries[card_path] = entry
+            self._entries.move_to_end(card_path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def get(self, card_path: str) -> Any:
+        """Parsed card"""
+        return self._entry(card_path)[2]
+
+    def prompt_text(self, card_path: str) -> str:
+        """Card as rendered into the search prompt"""
+        return self._entry(card_path)[3]
+
+    def invalidate(self, card_path: Optional[str] = None) -> None:
+        with self._lock:
+            if card_path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(card_path, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries),
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "evictions": self.evictions}
@@ -0,0 +1,183 @@
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class SQLiteLRUCache:
+    """
+    Persistent key/value cache in a single SQLite file.
+
+    Values are stored as blobs together with their size and last access time;
+    once the stored payload exceeds `max_bytes` the least recently used entries
+    are evicted. Safe to share between threads of one process.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed)")
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._total_bytes = self._stored_bytes()
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _stored_bytes(self) -> int:
+        row = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return int(row[0])
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        keys = list(dict.fromkeys(keys))
+        found: Dict[str, bytes] = {}
+        if not keys:
+            return found
+        with self._lock:
+            # stay below SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM entries WHERE key IN ({marks})", chunk).fetchall()
+                found.update((key, bytes(value)) for key, value in rows)
+            if found:
+                now = time.time()
+                self._conn.executemany("UPDATE entries SET accessed = ? WHERE key = ?",
+                                       [(now, key) for key in found])
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set(self, key: str, value: bytes) -> None:
+        self.set_many([(key, value)])
+
+    def set_many(self, items: List[Tuple[str, bytes]]) -> None:
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO entries (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                    [(key, sqlite3.Binary(value), len(value), now) for key, value in items])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._total_bytes += sum(len(value) for _, value in items)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._total_bytes -= row[0]
+
+    def _evict(self) -> None:
+        # re-read the real size first: replaced keys and other processes skew the counter
+        self._total_bytes = self._stored_bytes()
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM entries ORDER BY accessed ASC LIMIT 256").fetchall()
+            if not rows:
+                break
+            victims = []
+            for key, size in rows:
+                if self._total_bytes <= self.max_bytes:
+                    break
+                victims.append((key,))
+                self._total_bytes -= size
+            self._conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+            self.evictions += len(victims)
+        logger.debug(f"Cache {self.path} evicted down to {self._total_bytes} bytes")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._total_bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": entries,
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+class LLMResponseCache(SQLiteLRUCache):
+    """Content-addressed cache of chat completions"""
+
+    def response_key(self,
+                     model: str,
+                     system_prompt: str,
+                     input_prompt: str,
+                     temperature: float,
+                     max_tokens: int) -> str:
+        return self.make_key(model, system_prompt, input_prompt, temperature, max_tokens)
+
+    def get_response(self, key: str) -> Optional[str]:
+        value = self.get(key)
+        return value.decode("utf-8") if value is not None else None
+
+    def set_response(self, key: str, response: str) -> None:
+        if response is not None:
+            self.set(key, response.encode("utf-8"))
+
+
+class EmbeddingCache(SQLiteLRUCache):
+    """Float32 embedding vectors keyed by (model, dimension, sha1(text))"""
+
+    @staticmethod
+    def vector_key(model: str, dimension: int, text: str) -> str:
+        return f"{model}:{dimension}:{hashlib.sha1(text.encode('utf-8')).hexdigest()}"
+
+    def get_vectors(self, model: str, dimension: int, texts: List[str]) -> Dict[str, List[float]]:
+        keys = {self.vector_key(model, dimension, text): text for text in texts}
+        found = self.get_many(keys.keys())
+        vectors = {}
+        for key, blob in found.items():
+            vector = array("f")
+            vector.frombytes(blob)
+            vectors[keys[key]] = vector.tolist()
+        return vectors
+
+    def set_vectors(self, model: str, dimension: int, vectors: Dict[str, List[float]]) -> None:
+        self.set_many([(self.vector_key(model, dimension, text), array("f", vector).tobytes())
+                       for text, vector in vectors.items()])
@@ -1,6 +1,6 @@
 import os
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Callable
 import chromadb
 from chromadb.config import Settings
 from ..storage.episode import Episode
@@ -9,28 +9,119 @@ from ..storage.experience import ExperienceMemory
 from ..storage.thread import ThreadMemory
 from .embedding import Embedding
 from .config import MemoryConfig
+from .numpy_index import NumpyVectorClient
+from .quantization import QUANTIZATION_MODES
+from ..storage.vector_store import MmapVectorStore
+from ..utils.tracing import traced
+from ..utils.parallel import ordered_map
 from abc import ABC, abstractmethod
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
+from concurrent.futures import Executor
+import asyncio
+import atexit
+import functools
+import shutil
+import tempfile
 import threading
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
+
+class EmbeddingDimensionError(ValueError):
+    """A collection holds embeddings of a different size than the embedding client produces"""
+
+
+def _episode_hit(doc_id: str, document: str, metadata: Dict[str, Any], distance: float) -> Dict[str, Any]:
+    return {
+        "episode_id": doc_id,
+        "title": metadata.get('title', ''),
+        "content": document,
+        "distance": distance,
+        "score": 1 - distance,
+        "metadata": metadata,
+        "type": "episode"
+    }
+
+
+def _semantic_hit(doc_id: str, document: str, metadata: Dict[str, Any], distance: float) -> Dict[str, Any]:
+    return {
+        "memory_id": doc_id,
+        "content": document,
+        "knowledge_type": metadata.get('knowledge_type', ''),
+        "distance": distance,
+        "score": 1 - distance,
+        "metadata": metadata,
+        "type": "semantic"
+    }
+
+
+def _experience_hit(doc_id: str, document: str, metadata: Dict[str, Any], distance: float) -> Dict[str, Any]:
+    return {
+        "experience_id": doc_id,
+        "title": metadata.get('title', ''),
+        "content": document,
+        "distance": distance,
+        "score": 1 - distance,
+        "metadata": metadata,
+        "type": "experience"
+    }
+
+
+def _thread_hit(doc_id: str, document: str, metadata: Dict[str, Any], distance: float) -> Dict[str, Any]:
+    return {
+        "memory_id": doc_id,
+        "content": document,
+        "source_episode": metadata.get('source_episode', ''),
+        "knowledge_type": metadata.get('knowledge_type', ''),
+        "distance": distance,
+        "score": 1 - distance,
+        "metadata": metadata,
+        "type": "thread"
+    }
+
+
+# collection kind -> (search hit builder, name used in logs)
+_SEARCH_KINDS = {
+    "episode": (_episode_hit, "Episode"),
+    "semantic": (_semantic_hit, "SemanticMemory"),
+    "experience": (_experience_hit, "Experience"),
+    "thread": (_thread_hit, "ThreadMemory"),
+}
+
+
 class ChromaEngine:
     def __init__(self, embedding_client: Embedding, config: MemoryConfig):
         self.embedding_client = embedding_client
         self.config = config
         
         self.persist_directory = config.chroma_persist_directory
-        os.makedirs(self.persist_directory, exist_ok=True)
-        
-        self.client = chromadb.PersistentClient(
-            path=self.persist_directory,
-            settings=Settings(anonymized_telemetry=False, 
-                              allow_reset=True))
+        if config.vector_index_backend == "memory":
+            # process-local NumPy collections behind the same collection API, nothing is persisted
+            logger.warning("vector_index_backend=\"memory\": vectors live only in this process and are lost "
+                           "on exit, ingest and answer in the same process")
+            self.client = NumpyVectorClient(**self._quantization_options(config))
+        else:
+            os.makedirs(self.persist_directory, exist_ok=True)
+
+            self.client = chromadb.PersistentClient(
+                path=self.persist_directory,
+                settings=Settings(anonymized_telemetry=False, 
+                                  allow_reset=True))
         
         self.collection_prefix = config.chroma_collection_prefix
+
+        # optional memory-mapped copy of every written vector, read by the Categorizer
+        self.vector_store = MmapVectorStore(config.vector_store_path,
+                                            dtype=config.vector_store_dtype) if config.vector_store_enabled else None
         
         self._collection_locks = defaultdict(threading.RLock)
+
+        self._handle_lock = threading.Lock()
+        self._collection_handles: "OrderedDict[str, Any]" = OrderedDict()
+        # embedding width stored in each collection, checked on every read and write
+        self._collection_dims: Dict[str, int] = {}
+        self._collection_cache_size = config.collection_cache_size
         
     
     def _get_collection_lock(self, collection_name: str) -> threading.RLock:
@@ -47,464 +138,494 @@ class ChromaEngine:
 
     def _get_thread_collection_name(self, user_id: str) -> str:
         return f"{self.collection_prefix}_{user_id}_thread"
+
+    @staticmethod
+    def _quantization_options(config: MemoryConfig) -> Dict[str, Any]:
+        # keyed by the collection metadata "type"
+        quantization = {
+            "episodes": config.episode_quantization,
+            "semantic": config.semantic_quantization,
+            "experiences": config.experience_quantization,
+            "thread": config.thread_quantization,
+        }
+        for collection_type, mode in quantization.items():
+            if mode not in QUANTIZATION_MODES:
+                raise ValueError(f"Unknown quantization {mode!r} for {collection_type}, expected one of {QUANTIZATION_MODES}")
+        if all(mode == "none" for mode in quantization.values()):
+            return {}
+        # the collections are process-local, so their full vectors get a private
+        # subdirectory that is removed on exit; existing files are never touched
+        os.makedirs(config.quantized_vectors_path, exist_ok=True)
+        run_path = tempfile.mkdtemp(prefix=f"run-{os.getpid()}-", dir=config.quantized_vectors_path)
+        atexit.register(shutil.rmtree, run_path, True)
+        return {
+            "quantization": quantization,
+            # full vectors are reranked in float32
+            "vector_store": MmapVectorStore(run_path, dtype="float32"),
+            "rerank": config.quantization_rerank,
+            "pq_subspaces": config.pq_subspaces,
+            "pq_train_size": config.pq_train_size,
+        }
+
+    # kind -> (collection name builder, collection metadata type)
+    _COLLECTION_KINDS = {
+        "episode": (_get_episode_collection_name, "episodes"),
+        "semantic": (_get_semantic_collection_name, "semantic"),
+        "experience": (_get_experience_collection_name, "experiences"),
+        "thread": (_get_thread_collection_name, "thread"),
+    }
         
-    def _get_episode_collection(self, user_id: str):
-        collection_name = self._get_episode_collection_name(user_id)
+    def _load_dimension(self, collection_name: str, collection) -> None:
+        # width of the stored vectors, sampled once when the handle is opened
+        if collection.count():
+            sample = collection.peek(limit=1).get("embeddings")
+            if sample is not None and len(sample):
+                with self._handle_lock:
+                    self._collection_dims[collection_name] = len(sample[0])
+        self._check_dimension(collection_name, self.embedding_client.embedding_dim)
+
+    def _check_dimension(self, collection_name: str, width: int) -> None:
+        # vectors of different sizes cannot be compared, refuse to mix them in one collection
+        with self._handle_lock:
+            stored = self._collection_dims.get(collection_name)
+        if stored is not None and width != stored:
+            raise EmbeddingDimensionError(f"Collection {collection_name} holds {stored}-dimensional embeddings "
+                                          f"but got {width}-dimensional ones; "
+                                          f"set embedding_dimension={stored} or rebuild the collection")
+
+    def _get_collection(self, user_id: str, kind: str):
+        """
+        Return the collection handle of `kind` for a user, creating it if missing.
+
+        Handles are kept in a bounded LRU cache keyed by collection name, so
+        the Chroma metadata lookup only happens on the first access.
+        """
+        name_fn, collection_type = self._COLLECTION_KINDS[kind]
+        collection_name = name_fn(self, user_id)
+
+        with self._handle_lock:
+            collection = self._collection_handles.get(collection_name)
+            if collection is not None:
+                self._collection_handles.move_to_end(collection_name)
+                return collection
 
         with self._get_collection_lock(collection_name):
-            try:
-                collection = self.client.get_collection(name=collection_name)
-                logger.debug(f"Episode Collection: {collection_name}")
-            except (ValueError, Exception) as e:
-                try:
-                    collection = self.client.create_collection(
-                        name=collection_name,
-                        metadata={"user_id": user_id, "type": "episodes"}
-                    )
-                    logger.info(f"Create new Episode Collection: {collection_name}")
-                except Exception as create_error:
-                    logger.error(f"Create Episode Set Fail: {create_error}")
-                    try:
-                        self.client.delete_collection(name=collection_name)
-                    except:
-                        pass
-                    collection = self.client.create_collection(
-                        name=collection_name,
-                        metadata={"user_id": user_id, "type": "episodes"}
-                    )
-                    logger.info(f"Recreate Episode Collection: {collection_name}")
-            
-        
-            return collection
-    
-    def _get_semantic_collection(self, user_id: str):
-        collection_name = self._get_semantic_collection_name(user_id)
+            collection = self.client.get_or_create_collection(
+                name=collection_name,
+                metadata={"user_id": user_id, "type": collection_type})
+            self._load_dimension(collection_name, collection)
+            logger.debug(f"Opened {kind} collection: {collection_name}")
+
+        with self._handle_lock:
+            self._collection_handles[collection_name] = collection
+            self._collection_handles.move_to_end(collection_name)
+            while len(self._collection_handles) > self._collection_cache_size:
+                self._collection_handles.popitem(last=False)
+        return collection
+
+    def invalidate_collection(self, collection_name: str) -> None:
+        """Drop a cached handle, e.g. after the collection was deleted or reset"""
+        with self._handle_lock:
+            self._collection_handles.pop(collection_name, None)
+            self._collection_dims.pop(collection_name, None)
+
+    def clear_collection_cache(self) -> None:
+        with self._handle_lock:
+            self._collection_handles.clear()
+            self._collection_dims.clear()
+
+    @traced()
+    def delete_collection(self, collection_name: str) -> None:
         with self._get_collection_lock(collection_name):
-            try:
-                collection = self.client.get_collection(name=collection_name)
-                logger.debug(f"Get existing Semantic Set: {collection_name}")
-            except (ValueError, Exception) as e:
-                try:
-                    collection = self.client.create_collection(
-                        name=collection_name,
-                        metadata={"user_id": user_id, "type": "semantic"}
-                    )
-                    logger.info(f"Create new Semantic Set: {collection_name}")
-                except Exception as create_error:
-                    logger.error(f"Create Semantic Set Fail: {create_error}")
-                    try:
-                        self.client.delete_collection(name=collection_name)
-                    except:
-                        pass
-                    collection = self.client.create_collection(
-                        name=collection_name,
-                        metadata={"user_id": user_id, "type": "semantic"}
-                    )
-                    logger.info(f"Recreating Semantic collection: {collection_name}")
-        
-            return collection
-    
-
-    def _get_experience_collection(self, user_id: str):
-        collection_name = self._get_experience_collection_name(user_id)
+            self.client.delete_collection(name=collection_name)
+            self.invalidate_collection(collection_name)
+            if self.vector_store is not None:
+                self.vector_store.drop(collection_name)
 
-        with self._get_collection_lock(collection_name):
-            try:
-                collection = self.client.get_collection(name=collection_name)
-                logger.debug(f"Retrieved existing Experience collection: {collection_name}")
-            except (ValueError, Exception) as e:
-                try:
-                    collection = self.client.create_collection(
-                        name=collection_name,
-                        metadata={"user_id": user_id, "type": "experiences"}
-                    )
-                    logger.info(f"Creating new Experience collection: {collection_name}")
-                except Exception as create_error:
-                    logger.error(f"Failed to create Experience collection: {create_error}")
-                    try:
-                        self.client.delete_collection(name=collection_name)
-                    except:
-                        pass
-                    collection = self.client.create_collection(
-                        name=collection_name,
-                        metadata={"user_id": user_id, "type": "experiences"}
-                    )
-                    logger.info(f"Recreating Experience collection: {collection_name}")
-            
-        
-            return collection
+    def _get_episode_collection(self, user_id: str):
+        return self._get_collection(user_id, "episode")
     
+    def _get_semantic_collection(self, user_id: str):
+        return self._get_collection(user_id, "semantic")
+
     def _get_experience_collection(self, user_id: str):
-        collection_name = self._get_experience_collection_name(user_id)
-        with self._get_collection_lock(collection_name):
-            try:
-                collection = self.client.get_collection(name=collection_name)
-                logger.debug(f"Retrieved existing Experience collection: {collection_name}")
-            except (ValueError, Exception) as e:
-                try:
-                    collection = self.client.create_collection(
-                        name=collection_name,
-                        metadata={"user_id": user_id, "type": "experiences"})
-                    logger.info(f"Creating new Experience collection: {collection_name}")
-                except Exception as create_error:
-                    logger.error(f"Failed to create Experience collection: {create_error}")
-                    try:
-                        self.client.delete_collection(name=collection_name)
-                    except:
-                        pass
-                    collection = self.client.create_collection(
-                        name=collection_name,
-                        metadata={"user_id": user_id, "type": "experiences"})
-                    logger.info(f"Recreating Experience collection: {collection_name}")
-        
-            return collection
-    
+        return self._get_collection(user_id, "experience")
 
     def _get_thread_collection(self, user_id: str):
-        collection_name = self._get_thread_collection_name(user_id)
+        return self._get_collection(user_id, "thread")
 
-        with self._get_collection_lock(collection_name):
-            try:
-                collection = self.client.get_collection(name=collection_name)
-                logger.debug(f"Retrieved existing Thread collection: {collection_name}")
-            except (ValueError, Exception) as e:
+    
+    def _episode_record(self, episode: Episode) -> Tuple[str, str, str, Dict[str, Any]]:
+        metadata = {
+            "episode_id": episode.episode_id,
+            "user_id": episode.user_id,
+            "created_at": episode.created_at.isoformat(),
+            "timestamp": episode.timestamp,
+            "type": "episode"
+        }
+        return episode.episode_id, episode.summary, f"{episode.summary}", metadata
+
+    def _semantic_record(self, memory: SemanticMemory) -> Tuple[str, str, str, Dict[str, Any]]:
+        metadata = {
+            "memory_id": memory.memory_id,
+            "user_id": memory.user_id,
+            "created_at": memory.created_at.isoformat(),
+            "source_episode": memory.source_episode,  
+            "revision_count": memory.revision_count,
+            "type": "semantic"
+        }
+        if memory.updated_at:
+            metadata["updated_at"] = memory.updated_at.isoformat()
+        return memory.memory_id, memory.content, memory.content, metadata
+
+    def _experience_record(self, experience: ExperienceMemory) -> Tuple[str, str, str, Dict[str, Any]]:
+        metadata = {
+            "experience_id": experience.memory_id,
+            "user_id": experience.user_id,
+            "created_at": experience.created_at.isoformat(),
+            "timestamp": experience.timestamp,
+            "source_episode": experience.source_episode, 
+            "type": "experience"
+        }
+        return experience.memory_id, experience.content, f"Keywords:{experience.content}", metadata
+
+    def _thread_record(self, thread: ThreadMemory) -> Tuple[str, str, str, Dict[str, Any]]:
+        metadata = {
+            "source_episode": thread.source_episode,
+            "user_id": thread.user_id,
+            "created_at": thread.created_at.isoformat(),
+            "type": "thread"}
+        return thread.thread_id, thread.content, f"{thread.content}", metadata
+
+    def _memory_kinds(self) -> Dict[str, Tuple[Callable, Callable, Callable]]:
+        return {
+            "episode": (self._get_episode_collection_name, self._get_episode_collection, self._episode_record),
+            "semantic": (self._get_semantic_collection_name, self._get_semantic_collection, self._semantic_record),
+            "experience": (self._get_experience_collection_name, self._get_experience_collection, self._experience_record),
+            "thread": (self._get_thread_collection_name, self._get_thread_collection, self._thread_record),
+        }
+
+    def _pending_records(self, items: List[Tuple[str, str, Any]]) -> List[Tuple[str, str, List[Tuple]]]:
+        # group by target collection and drop ids that are already stored
+        kinds = self._memory_kinds()
+        grouped = defaultdict(list)
+        for kind, user_id, memory in items:
+            grouped[(kind, user_id)].append(kinds[kind][2](memory))
+
+        pending = []
+        for (kind, user_id), records in grouped.items():
+            name_fn, get_fn, _ = kinds[kind]
+            unique = {}
+            for record in records:
+                unique.setdefault(record[0], record)
+            if self.config.deterministic_ids:
+                # content-hash ids: duplicates collapse in the upsert, no pre-read needed
+                pending.append((kind, user_id, list(unique.values())))
+                continue
+            with self._get_collection_lock(name_fn(user_id)):
+                collection = get_fn(user_id)
+                existing = set(collection.get(ids=list(unique.keys()), include=[])['ids'])
+                if existing:
+                    logger.debug(f"{len(existing)} {kind} records exist in {name_fn(user_id)}, ignore")
+                records = [record for record_id, record in unique.items() if record_id not in existing]
+            if records:
+                pending.append((kind, user_id, records))
+        return pending
+
+    def _add_pending(self, pending: List[Tuple[str, str, List[Tuple]]], embeddings: List[List[float]]) -> int:
+        kinds = self._memory_kinds()
+        # one float32 block instead of a Python float list per vector
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        offset = 0
+        for kind, user_id, records in pending:
+            name_fn, get_fn, _ = kinds[kind]
+            collection_name = name_fn(user_id)
+            batch_embeddings = embeddings[offset:offset + len(records)]
+            offset += len(records)
+            with self._get_collection_lock(collection_name):
                 try:
-                    collection = self.client.create_collection(
-                        name=collection_name,
-                        metadata={"user_id": user_id, "type": "thread"})
-                    
-                    logger.info(f"Creating new Thread collection: {collection_name}")
-                except Exception as create_error:
-                    logger.error(f"Failed to create Thread collection: {create_error}")
-                    try:
-                        self.client.delete_collection(name=collection_name)
-                    except:
-                        pass
-                    collection = self.client.create_collection(
-                        name=collection_name,
-                        metadata={"user_id": user_id, "type": "thread"})
-                    
-                    logger.info(f"Recreating Thread collection: {collection_name}")
-            
-            return collection
+                    collection = get_fn(user_id)
+                    self._check_dimension(collection_name, batch_embeddings.shape[1])
+                    write = collection.upsert if self.config.deterministic_ids else collection.add
+                    write(
+                        ids=[record[0] for record in records],
+                        documents=[record[1] for record in records],
+                        metadatas=[record[3] for record in records],
+                        embeddings=batch_embeddings
+                    )
+                    with self._handle_lock:
+                        self._collection_dims.setdefault(collection_name, batch_embeddings.shape[1])
+                    if self.vector_store is not None:
+                        self.vector_store.append(collection_name, [record[0] for record in records], batch_embeddings)
+                    logger.debug(f"add {len(records)} {kind} records to user {user_id}")
+                except Exception as e:
+                    logger.error(f"add {len(records)} {kind} records to user {user_id} Error: {e}")
+                    raise
+        return offset
+
+    @traced()
+    def _write_records(self, items: List[Tuple[str, str, Any]]) -> int:
+        """
+        Bulk write memories given as (kind, user_id, memory) tuples.
+
+        Items are grouped by target collection, existing ids are filtered with
+        one get per collection, all remaining texts are embedded in a single
+        embed_texts call and each collection is written with a single add.
+        With deterministic ids the pre-read is skipped and writes are upserts.
+        Returns the number of newly written records.
+        """
+        if not items:
+            return 0
+
+        pending = self._pending_records(items)
+        if not pending:
+            return 0
+
+        embed_texts = [record[2] for _, _, records in pending for record in records]
+        embeddings = self.embedding_client.embed_texts(embed_texts).embeddings
+        return self._add_pending(pending, embeddings)
+
+    @staticmethod
+    def _batch_items(episodes: Optional[List[Episode]] = None,
+                     semantic_memories: Optional[List[SemanticMemory]] = None,
+                     experience_memories: Optional[List[ExperienceMemory]] = None,
+                     thread_memories: Optional[List[ThreadMemory]] = None) -> List[Tuple[str, str, Any]]:
+        # every memory goes to the collection of its own user_id
+        items = []
+        items.extend(("episode", episode.user_id, episode) for episode in episodes or [])
+        items.extend(("semantic", memory.user_id, memory) for memory in semantic_memories or [])
+        items.extend(("experience", memory.user_id, memory) for memory in experience_memories or [])
+        items.extend(("thread", memory.user_id, memory) for memory in thread_memories or [])
+        return items
+
+    @traced()
+    def add_memories_batch(self,
+                           episodes: Optional[List[Episode]] = None,
+                           semantic_memories: Optional[List[SemanticMemory]] = None,
+                           experience_memories: Optional[List[ExperienceMemory]] = None,
+                           thread_memories: Optional[List[ThreadMemory]] = None) -> int:
+        items = self._batch_items(episodes, semantic_memories, experience_memories, thread_memories)
+        return self._write_records(items)
 
-    
     def add_episode(self, user_id: str, episode: Episode):
-        collection_name = self._get_episode_collection_name(user_id)
-        with self._get_collection_lock(collection_name):
-            try:
-                collection = self._get_episode_collection(user_id)
-                
-                existing = collection.get(ids=[episode.episode_id])
-                if existing['ids']:
-                    logger.debug(f"Episode {episode.episode_id} exists, ignore")
-                    return
-                
-                embed_text = f"{episode.summary}"
-                metadata = {
-                    "episode_id": episode.episode_id,
-                    "user_id": episode.user_id,
-                    "created_at": episode.created_at.isoformat(),
-                    "timestamp": episode.timestamp,
-                    "type": "episode"
-                }
-                
-                embedding_response = self.embedding_client.embed_texts([embed_text])
-                embedding = embedding_response.embeddings[0]
-
-                collection.add(
-                    ids=[episode.episode_id],
-                    documents=[episode.summary],
-                    metadatas=[metadata],
-                    embeddings=[embedding]
-                )
-                
-                logger.debug(f"add Episode {episode.episode_id} to user {user_id}")
-                
-            except Exception as e:
-                logger.error(f"add Episode {episode.episode_id} to user {user_id} Error: {e}")
-                raise
+        self._write_records([("episode", user_id, episode)])
     
     def add_semantic_memory(self, user_id: str, memory: SemanticMemory):
-        collection_name = self._get_semantic_collection_name(user_id)
-        with self._get_collection_lock(collection_name):
-            try:
-                collection = self._get_semantic_collection(user_id)
-                
-                existing = collection.get(ids=[memory.memory_id])
-                if existing['ids']:
-                    logger.debug(f"SemanticMemory {memory.memory_id} already exists, skipping addition")
-                    return
-                
-                metadata = {
-                    "memory_id": memory.memory_id,
-                    "user_id": memory.user_id,
-                    "created_at": memory.created_at.isoformat(),
-                    "source_episode": memory.source_episode,  
-                    "revision_count": memory.revision_count,
-                    "type": "semantic"
-                }
-                
-                if memory.updated_at:
-                    metadata["updated_at"] = memory.updated_at.isoformat()
-                
-                embedding_response = self.embedding_client.embed_texts([memory.content])
-                embedding = embedding_response.embeddings[0]
-
-                collection.add(
-                    ids=[memory.memory_id],
-                    documents=[memory.content],
-                    metadatas=[metadata],
-                    embeddings=[embedding]
-                )
-
-                logger.debug(f"SemanticMemory {memory.memory_id} to user {user_id}")
-                
-            except Exception as e:
-                logger.error(f"SemanticMemory {memory.memory_id} to user {user_id} Error: {e}")
-                raise
+        self._write_records([("semantic", user_id, memory)])
         
     def add_semantic_memories(self,semantic_memories:List[SemanticMemory]):
-
-        for memory in semantic_memories:
-            self.add_semantic_memory(user_id=memory.user_id,
-                                     memory=memory)
-            
+        self.add_memories_batch(semantic_memories=semantic_memories)
 
     def add_experience_memory(self, user_id: str, experience: ExperienceMemory):
-        collection_name = self._get_experience_collection_name(user_id)
-        with self._get_collection_lock(collection_name):
-            try:
-                collection = self._get_experience_collection(user_id)
-                
-                existing = collection.get(ids=[experience.experience_id])
-                if existing['ids']:
-                    logger.debug(f"Episode {experience.experience_id} exists, ignore")
-                    return
-                
-                embed_text = f"Keywords:{experience.content}"
-                metadata = {
-                    "experience_id": experience.memory_id,
-                    "user_id": experience.user_id,
-                    "created_at": experience.created_at.isoformat(),
-                    "timestamp": experience.timestamp,
-                    "source_episode": experience.source_episode, 
-                    "type": "experience"
-                }
-                
-                embedding_response = self.embedding_client.embed_texts([embed_text])
-                embedding = embedding_response.embeddings[0]
-
-                collection.add(
-                    ids=[experience.memory_id],
-                    documents=[experience.content],
-                    metadatas=[metadata],
-                    embeddings=[embedding]
-                )
-                
-                logger.debug(f"add Experience {experience.memory_id} to user {user_id}")
-                
-            except Exception as e:
-                logger.error(f"add Experience {experience.memory_id} to user {user_id} Error: {e}")
-                raise
+        self._write_records([("experience", user_id, experience)])
 
     def add_experience_memories(self,experience_memories:List[ExperienceMemory]):
-        
-        for memory in experience_memories:
-            self.add_experience_memory(user_id=memory.user_id,
-                                     experience=memory)
-            
+        self.add_memories_batch(experience_memories=experience_memories)
 
     def add_thread_memory(self, user_id: str, thread: ThreadMemory):
-        collection_name = self._get_thread_collection_name(user_id)
+        self._write_records([("thread", user_id, thread)])
 
-        with self._get_collection_lock(collection_name):
-            try:
-                collection = self._get_thread_collection(user_id)
-                
-                existing = collection.get(ids=[thread.thread_id])
-                if existing['ids']:
-                    logger.debug(f"Thread {thread.thread_id} exists, ignore")
-                    return
-                
-                embed_text = f"{thread.content}"
-                metadata = {
-                    "source_episode": thread.source_episode,
-                    "user_id": thread.user_id,
-                    "created_at": thread.created_at.isoformat(),
-                    "type": "thread"}
-                
-                embedding_response = self.embedding_client.embed_texts([embed_text])
-                embedding = embedding_response.embeddings[0]
-
-                collection.add(
-                    ids=[thread.thread_id],
-                    documents=[thread.content],
-                    metadatas=[metadata],
-                    embeddings=[embedding])
-                
-                logger.debug(f"add Thread {thread.thread_id} to user {user_id}")
-                
-            except Exception as e:
-                logger.error(f"add Thread {thread.thread_id} to user {user_id} Error: {e}")
-                raise
+    def add_thread_memories(self, thread_memories: List[ThreadMemory]):
+        self.add_memories_batch(thread_memories=thread_memories)
 
     
-    def search_episodes(self, user_id: str, query: str, top_k: int = 10) -> List[Dict[str, Any]]:
-        
-        collection_name = self._get_episode_collection_name(user_id)
-        with self._get_collection_lock(collection_name):
-            try:
-                collection = self._get_episode_collection(user_id)
-                
-                if collection.count() == 0:
-                    logger.debug(f"Episode collection is empty for user {user_id}")
-                    return []
-                
-                query_embedding = self.embedding_client.embed_text(query)
-                
-                results = collection.query(
-                    query_embeddings=[query_embedding],
-                    n_results=min(top_k, collection.count())
-                )
-                
-                search_results = []
-                for i, doc_id in enumerate(results['ids'][0]):
-                    result = {
-                        "episode_id": doc_id,
-                        "title": results['metadatas'][0][i].get('title', ''),
-                        "content": results['documents'][0][i],
-                        "distance": results['distances'][0][i],
-                        "score": 1 - results['distances'][0][i],  
-                        "metadata": results['metadatas'][0][i],
-                        "type": "episode"
-                    }
-                    search_results.append(result)
-                
-                logger.debug(f"Search for user {user_id} episodes returned {len(search_results)} results")
-                return search_results
-                
-            except Exception as e:
-                logger.error(f"Failed to search episodes for user {user_id}: {e}")
-                return []
-        
-    def search_semantic_memories(self, user_id: str, query: str, top_k: int = 10) -> List[Dict[str, Any]]:
-        collection_name = self._get_semantic_collection_name(user_id)
+    def _query_collection(self,
+                          user_id: str,
+                          kind: str,
+                          query_embeddings: List[List[float]],
+                          top_k: int) -> List[List[Dict[str, Any]]]:
+        """One Chroma query for a batch of query vectors, returns one hit list per vector"""
+        hit_fn, label = _SEARCH_KINDS[kind]
+        collection_name = self._COLLECTION_KINDS[kind][0](self, user_id)
         with self._get_collection_lock(collection_name):
             try:
-                collection = self._get_semantic_collection(user_id)
-                
-                if collection.count() == 0:
-                    logger.debug(f"SemanticMemory collection is empty for user {user_id}")
-                    return []
-                
-                query_embedding = self.embedding_client.embed_text(query)
-                
-                results = collection.query(
-                    query_embeddings=[query_embedding],
-                    n_results=min(top_k, collection.count())
-                )
-                
-                search_results = []
-                for i, doc_id in enumerate(results['ids'][0]):
-                    result = {
-                        "memory_id": doc_id,
-                        "content": results['documents'][0][i],
-                        "knowledge_type": results['metadatas'][0][i].get('knowledge_type', ''),
-                        "distance": results['distances'][0][i],
-                        "score": 1 - results['distances'][0][i],  
-                        "metadata": results['metadatas'][0][i],
-                        "type": "semantic"
-                    }
-                    search_results.append(result)
-                
-                logger.debug(f"Search for user {user_id} SemanticMemory returned {len(search_results)} results")
-                return search_results
-                
-            except Exception as e:
-                logger.error(f"Failed to search SemanticMemory for user {user_id}: {e}")
-                return []
+                collection = self._get_collection(user_id, kind)
+                for query_embedding in query_embeddings:
+                    self._check_dimension(collection_name, len(query_embedding))
 
+                count = collection.count()
+                if count == 0:
+                    logger.debug(f"{label} collection is empty for user {user_id}")
+                    return [[] for _ in query_embeddings]
 
-    def search_experiences(self, user_id: str, query: str, top_k: int = 10) -> List[Dict[str, Any]]:
-        
-        collection_name = self._get_experience_collection_name(user_id)
-        with self._get_collection_lock(collection_name):
-            try:
-                collection = self._get_experience_collection(user_id)
-                
-                if collection.count() == 0:
-                    logger.debug(f"Experience collection is empty for user {user_id}")
-                    return []
-                
-                query_embedding = self.embedding_client.embed_text(query)
-                
                 results = collection.query(
-                    query_embeddings=[query_embedding],
-                    n_results=min(top_k, collection.count())
+                    query_embeddings=list(query_embeddings),
+                    n_results=min(top_k, count)
                 )
-                
-                search_results = []
-                for i, doc_id in enumerate(results['ids'][0]):
-                    result = {
-                        "experience_id": doc_id,
-                        "title": results['metadatas'][0][i].get('title', ''),
-                        "content": results['documents'][0][i],
-                        "distance": results['distances'][0][i],
-                        "score": 1 - results['distances'][0][i], 
-                        "metadata": results['metadatas'][0][i],
-                        "type": "experience"
-                    }
-                    search_results.append(result)
-                
-                logger.debug(f"Search for user {user_id} experiences returned {len(search_results)} results")
-                return search_results
-                
+            except EmbeddingDimensionError:
+                # a misconfigured embedding_dimension must not look like an empty result
+                raise
             except Exception as e:
-                logger.error(f"Failed to search experiences for user {user_id}: {e}")
-                return []
-            
-    def search_thread_memories(self, user_id: str, query: str, top_k: int = 10) -> List[Dict[str, Any]]:
-
-        collection_name = self._get_thread_collection_name(user_id)
-        with self._get_collection_lock(collection_name):
+                logger.error(f"Failed to search {label} for user {user_id}: {e}")
+                return [[] for _ in query_embeddings]
+
+        search_results = [
+            [hit_fn(*row) for row in zip(ids, documents, metadatas, distances)]
+            for ids, documents, metadatas, distances in zip(results['ids'], results['documents'],
+                                                            results['metadatas'], results['distances'])]
+        logger.debug(f"Search for user {user_id} {label} returned {sum(map(len, search_results))} results")
+        return search_results
+
+    def _search(self,
+                user_id: str,
+                kind: str,
+                query: str,
+                top_k: int,
+                query_embedding: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        if query_embedding is None:
             try:
-                collection = self._get_thread_collection(user_id)
-                
-                if collection.count() == 0:
-                    logger.debug(f"ThreadMemory collection is empty for user {user_id}")
-                    return []
-                
                 query_embedding = self.embedding_client.embed_text(query)
-                
-                results = collection.query(
-                    query_embeddings=[query_embedding],
-                    n_results=min(top_k, collection.count())
-                )
-                
-                search_results = []
-                for i, doc_id in enumerate(results['ids'][0]):
-
-                    result = {
-                        "memory_id": doc_id,
-                        "content": results['documents'][0][i],
-                        "source_episode": results['metadatas'][0][i].get('source_episode', ''),
-                        "knowledge_type": results['metadatas'][0][i].get('knowledge_type', ''),
-                        "distance": results['distances'][0][i],
-                        "score": 1 - results['distances'][0][i],  
-                        "metadata": results['metadatas'][0][i],
-                        "type": "thread"
-                    }
-                    search_results.append(result)
-
-                logger.debug(f"Search for user {user_id} ThreadMemory returned {len(search_results)} results")
-                return search_results
-                
             except Exception as e:
-                logger.error(f"Error fetching ThreadMemory for user {user_id}: {e}")
+                logger.error(f"Failed to embed query for user {user_id}: {e}")
                 return []
+        return self._query_collection(user_id, kind, [query_embedding], top_k)[0]
+
+    @traced()
+    def search_episodes(self, user_id: str, query: str, top_k: int = 10,
+                        query_embedding: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        return self._search(user_id, "episode", query, top_k, query_embedding)
+
+    @traced()
+    def search_semantic_memories(self, user_id: str, query: str, top_k: int = 10,
+                                 query_embedding: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        return self._search(user_id, "semantic", query, top_k, query_embedding)
+
+    @traced()
+    def search_experiences(self, user_id: str, query: str, top_k: int = 10,
+                           query_embedding: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        return self._search(user_id, "experience", query, top_k, query_embedding)
+
+    @traced()
+    def search_thread_memories(self, user_id: str, query: str, top_k: int = 10,
+                               query_embedding: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        return self._search(user_id, "thread", query, top_k, query_embedding)
+
+    @traced()
+    def search_batch(self,
+                     user_id: str,
+                     kind: str,
+                     query_embeddings: List[List[float]],
+                     top_k: int = 10) -> List[List[Dict[str, Any]]]:
+        """Search one collection for many precomputed query vectors in a single query"""
+        if not query_embeddings:
+            return []
+        return self._query_collection(user_id, kind, query_embeddings, top_k)
+
+    @traced()
+    def get_threads(self, user_id: str, thread_ids: List[str]) -> Dict[str, Any]:
+        collection = self._get_thread_collection(user_id=user_id)
+        return collection.get(ids=thread_ids, include=['documents', 'metadatas'])
+
+    @traced()
+    def search_all(self,
+                   user_id: str,
+                   query: str,
+                   top_ks: Dict[str, int],
+                   query_embedding: Optional[List[float]] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Embed the query once and search several collections of a user concurrently.
+
+        top_ks maps a collection kind ("episode", "semantic", "experience",
+        "thread") to its top_k; the result maps each kind to its hits.
+        """
+        unknown = set(top_ks) - set(_SEARCH_KINDS)
+        if unknown:
+            raise ValueError(f"Unknown collection kinds {sorted(unknown)}, expected {sorted(_SEARCH_KINDS)}")
+        if query_embedding is None:
+            query_embedding = self.embedding_client.embed_text(query)
+
+        kinds = list(top_ks)
+        results = ordered_map(lambda kind: self._query_collection(user_id, kind, [query_embedding], top_ks[kind])[0],
+                              kinds,
+                              max_workers=len(kinds))
+        return dict(zip(kinds, results))
         
 
+class AsyncChromaEngine:
+    """Asyncio facade over ChromaEngine: embeddings go through the async client, Chroma calls run in an executor."""
+
+    def __init__(self, backend: ChromaEngine, executor: Optional[Executor] = None):
+        self._backend = backend
+        self._executor = executor
+
+    @property
+    def backend(self) -> ChromaEngine:
+        return self._backend
+
+    async def _run(self, func: Callable, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def _write_records(self, items: List[Tuple[str, str, Any]]) -> int:
+        if not items:
+            return 0
+        pending = await self._run(self._backend._pending_records, items)
+        if not pending:
+            return 0
+        embed_texts = [record[2] for _, _, records in pending for record in records]
+        response = await self._backend.embedding_client.aembed_texts(embed_texts)
+        return await self._run(self._backend._add_pending, pending, response.embeddings)
+
+    async def add_memories_batch(self,
+                                 episodes: Optional[List[Episode]] = None,
+                                 semantic_memories: Optional[List[SemanticMemory]] = None,
+                                 experience_memories: Optional[List[ExperienceMemory]] = None,
+                                 thread_memories: Optional[List[ThreadMemory]] = None) -> int:
+        items = self._backend._batch_items(episodes, semantic_memories, experience_memories, thread_memories)
+        return await self._write_records(items)
+
+    async def add_episode(self, user_id: str, episode: Episode):
+        await self._write_records([("episode", user_id, episode)])
+
+    async def add_semantic_memories(self, semantic_memories: List[SemanticMemory]):
+        await self.add_memories_batch(semantic_memories=semantic_memories)
+
+    async def add_experience_memories(self, experience_memories: List[ExperienceMemory]):
+        await self.add_memories_batch(experience_memories=experience_memories)
+
+    async def add_thread_memories(self, thread_memories: List[ThreadMemory]):
+        await self.add_memories_batch(thread_memories=thread_memories)
+
+    async def _search(self, search_fn: Callable, user_id: str, query: str, top_k: int,
+                      query_embedding: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        if query_embedding is None:
+            query_embedding = await self._backend.embedding_client.aembed_text(query)
+        return await self._run(search_fn, user_id, query, top_k, query_embedding=query_embedding)
+
+    async def search_episodes(self, user_id: str, query: str, top_k: int = 10,
+                              query_embedding: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        return await self._search(self._backend.search_episodes, user_id, query, top_k, query_embedding)
+
+    async def search_semantic_memories(self, user_id: str, query: str, top_k: int = 10,
+                                       query_embedding: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        return await self._search(self._backend.search_semantic_memories, user_id, query, top_k, query_embedding)
+
+    async def search_experiences(self, user_id: str, query: str, top_k: int = 10,
+                                 query_embedding: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        return await self._search(self._backend.search_experiences, user_id, query, top_k, query_embedding)
+
+    async def search_thread_memories(self, user_id: str, query: str, top_k: int = 10,
+                                     query_embedding: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        return await self._search(self._backend.search_thread_memories, user_id, query, top_k, query_embedding)
+
+    async def search_all(self,
+                         user_id: str,
+                         query: str,
+                         top_ks: Dict[str, int]) -> Dict[str, List[Dict[str, Any]]]:
+        unknown = set(top_ks) - set(_SEARCH_KINDS)
+        if unknown:
+            raise ValueError(f"Unknown collection kinds {sorted(unknown)}, expected {sorted(_SEARCH_KINDS)}")
+        query_embedding = await self._backend.embedding_client.aembed_text(query)
+        kinds = list(top_ks)
+        results = await asyncio.gather(*(
+            self._run(self._backend._query_collection, user_id, kind, [query_embedding], top_ks[kind])
+            for kind in kinds))
+        return {kind: hits[0] for kind, hits in zip(kinds, results)}
+
+    async def get_threads(self, user_id: str, thread_ids: List[str]) -> Dict[str, Any]:
+        return await self._run(self._backend.get_threads, user_id, thread_ids)
+
+
 class VectorIndex(ABC):
     """Vector index abstraction for episodic/semantic retrieval."""
 
@@ -535,7 +656,17 @@ class ChromaIndex(VectorIndex):
         self._backend.add_experience_memories(memory)
 
     def add_thread(self,memory: ThreadMemory) -> None:
-        self._backend.add_thread_memory(memory)
+        self._backend.add_thread_memory(memory.user_id, memory)
+
+    def add_batch(self,
+                  episodes: Optional[List[Episode]] = None,
+                  semantic: Optional[List[SemanticMemory]] = None,
+                  experience: Optional[List[ExperienceMemory]] = None,
+                  threads: Optional[List[ThreadMemory]] = None) -> None:
+        self._backend.add_memories_batch(episodes=episodes,
+                                         semantic_memories=semantic,
+                                         experience_memories=experience,
+                                         thread_memories=threads)
 
     def search_episodes(self, user_id: str, query: str, top_k: int) -> List[Dict]:
         return self._backend.search_episodes(user_id, query, top_k)
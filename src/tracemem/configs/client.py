@@ -1,11 +1,22 @@
-from openai import OpenAI
-from typing import Optional
+from openai import OpenAI, AsyncOpenAI
+from typing import AsyncIterator, Iterator, Optional
+from ..cache.sqlite_cache import LLMResponseCache
+from .rate_limiter import RateLimiter, estimate_tokens
+from .concurrency import AdaptiveConcurrencyLimiter, NULL_SLOT
+from .usage import UsageTracker
+from ..utils.tracing import span
 import logging
 logger = logging.getLogger(__name__)
+import asyncio
 import time
 
 class Client:
-    def __init__(self, api_key: str, model: str = "gpt-4o-mini", base_url: str = ""):
+    def __init__(self, api_key: str, model: str = "gpt-4o-mini", base_url: str = "",
+                 cache: Optional[LLMResponseCache] = None,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 concurrency: Optional[AdaptiveConcurrencyLimiter] = None,
+                 usage: Optional[UsageTracker] = None,
+                 stream_usage: bool = True):
         """
         Initialize LLM client
         
@@ -13,6 +24,12 @@ class Client:
             api_key: OpenAI API key
             model: Model name
             base_url: API base URL
+            cache: Optional persistent response cache
+            rate_limiter: Optional shared RPM/TPM limiter
+            concurrency: Optional adaptive in-flight call gate
+            usage: Per-stage usage accounting, shared with other clients if given
+            stream_usage: Request token usage on streams (stream_options), turned
+                off automatically when the provider rejects the field
         """
         self.api_key = api_key
         self.model = model
@@ -28,33 +45,108 @@ class Client:
         self.max_retries = 3
         self.retry_delay = 1.0
         self.timeout = 30.0
+        self.temperature = 0.1
+        self.max_tokens = 16000
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.concurrency = concurrency
 
-        self._total_usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
-        
-        self._call_count = 0
+        self.usage = usage if usage is not None else UsageTracker()
+        self.stream_usage = stream_usage
+
+        self._async_client: Optional[AsyncOpenAI] = None
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        # created lazily so sync-only users never open an async http pool
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url
+            )
+        return self._async_client
+
+    def _messages(self, system_prompt, input_prompt):
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": input_prompt}
+        ]
+
+    def _stream_options(self):
+        # with include_usage the final chunk carries the token counts
+        return {"stream_options": {"include_usage": True}} if self.stream_usage else {}
+
+    def _disable_stream_usage(self, error: BaseException) -> bool:
+        # some OpenAI-compatible providers reject stream_options with a 400
+        if not self.stream_usage or getattr(error, "status_code", None) not in (400, 422):
+            return False
+        if "stream_options" not in str(error) and "include_usage" not in str(error):
+            return False
+        logger.warning(f"{self.base_url or 'provider'} rejected stream_options, streaming without usage")
+        self.stream_usage = False
+        return True
+
+    def _reconcile_usage(self, estimated_tokens: int, response) -> None:
+        usage = getattr(response, 'usage', None)
+        if self.rate_limiter is not None and usage is not None:
+            self.rate_limiter.reconcile(self.model, estimated_tokens, getattr(usage, 'total_tokens', None))
+
+    def _record_usage(self, stage: str, start: float, retries: int, response=None,
+                      error: bool = False, cache_hit: bool = False) -> None:
+        usage = getattr(response, 'usage', None)
+        self.usage.record(stage,
+                          latency=time.monotonic() - start,
+                          prompt_tokens=getattr(usage, 'prompt_tokens', 0) or 0,
+                          completion_tokens=getattr(usage, 'completion_tokens', 0) or 0,
+                          total_tokens=getattr(usage, 'total_tokens', None),
+                          retries=retries,
+                          error=error,
+                          cache_hit=cache_hit)
+
+    def _cache_key(self, system_prompt, input_prompt) -> Optional[str]:
+        if self.cache is None:
+            return None
+        return self.cache.response_key(self.model, system_prompt, input_prompt,
+                                       self.temperature, self.max_tokens)
+
+    def forget_response(self, system_prompt, input_prompt) -> None:
+        """Drop a cached completion the caller could not parse, so the next call asks the model again"""
+        cache_key = self._cache_key(system_prompt, input_prompt)
+        if cache_key is not None:
+            self.cache.delete(cache_key)
 
-    def client_response(self, system_prompt,input_prompt):
+    async def aforget_response(self, system_prompt, input_prompt) -> None:
+        if self.cache is not None:
+            await asyncio.to_thread(self.forget_response, system_prompt, input_prompt)
+
+    def client_response(self, system_prompt,input_prompt, stage: str = "default"):
+        start = time.monotonic()
+        cache_key = self._cache_key(system_prompt, input_prompt)
+        if cache_key is not None:
+            cached = self.cache.get_response(cache_key)
+            if cached is not None:
+                self._record_usage(stage, start, retries=0, cache_hit=True)
+                return cached
+
+        estimated_tokens = estimate_tokens(system_prompt, input_prompt)
         for attempt in range(self.max_retries):
             try:            
-                response = self.client.chat.completions.create(
-                    model=self.model,  
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": input_prompt}
-                    ],
-                    max_tokens=16000,
-                    temperature=0.1,
-                    stream=False
-                )
-                # if hasattr(response, 'usage'):
-                #     usage = response.usage
-                #     self._total_usage["prompt_tokens"] += usage.prompt_tokens
-                #     self._total_usage["completion_tokens"] += usage.completion_tokens
-                #     self._total_usage["total_tokens"] += usage.total_tokens
-
-                # self._call_count += 1
-                
+                if self.rate_limiter is not None:
+                    self.rate_limiter.acquire(self.model, estimated_tokens)
+                with self.concurrency.slot() if self.concurrency else NULL_SLOT:
+                    with span(f"llm.{stage}", model=self.model, attempt=attempt):
+                        response = self.client.chat.completions.create(
+                            model=self.model,  
+                            messages=self._messages(system_prompt, input_prompt),
+                            max_tokens=self.max_tokens,
+                            temperature=self.temperature,
+                            stream=False
+                        )
+                self._reconcile_usage(estimated_tokens, response)
+                self._record_usage(stage, start, retries=attempt, response=response)
                 result = response.choices[0].message.content
+                if cache_key is not None:
+                    self.cache.set_response(cache_key, result)
                 return result
                 
             except Exception as e:
@@ -62,4 +154,160 @@ class Client:
                 if attempt < self.max_retries - 1:
                     time.sleep(self.retry_delay * (2 ** attempt))
                 else:
-                    raise e
\ No newline at end of file
+                    self._record_usage(stage, start, retries=attempt, error=True)
+                    raise e
+
+    async def aclient_response(self, system_prompt, input_prompt, stage: str = "default"):
+        start = time.monotonic()
+        cache_key = self._cache_key(system_prompt, input_prompt)
+        if cache_key is not None:
+            # SQLite lookups stay off the event loop
+            cached = await asyncio.to_thread(self.cache.get_response, cache_key)
+            if cached is not None:
+                self._record_usage(stage, start, retries=0, cache_hit=True)
+                return cached
+
+        estimated_tokens = estimate_tokens(system_prompt, input_prompt)
+        for attempt in range(self.max_retries):
+            try:
+                if self.rate_limiter is not None:
+                    await self.rate_limiter.aacquire(self.model, estimated_tokens)
+                async with self.concurrency.aslot() if self.concurrency else NULL_SLOT:
+                    with span(f"llm.{stage}", model=self.model, attempt=attempt):
+                        response = await self.async_client.chat.completions.create(
+                            model=self.model,
+                            messages=self._messages(system_prompt, input_prompt),
+                            max_tokens=self.max_tokens,
+                            temperature=self.temperature,
+                            stream=False
+                        )
+                self._reconcile_usage(estimated_tokens, response)
+                self._record_usage(stage, start, retries=attempt, response=response)
+                result = response.choices[0].message.content
+                if cache_key is not None:
+                    await asyncio.to_thread(self.cache.set_response, cache_key, result)
+                return result
+
+            except Exception as e:
+                logger.warning(f"LLM API call failed (attempt {attempt + 1}/{self.max_retries}): {e}")
+                if attempt < self.max_retries - 1:
+                    await asyncio.sleep(self.retry_delay * (2 ** attempt))
+                else:
+                    self._record_usage(stage, start, retries=attempt, error=True)
+                    raise e
+
+    def client_stream(self, system_prompt, input_prompt, stage: str = "default") -> Iterator[str]:
+        """
+        Yield the completion text as it arrives.
+
+        Failures before the first chunk are retried like client_response,
+        a failure mid-stream is raised since part of the text was already yielded.
+
+        The concurrency slot covers only opening the stream, so the AIMD gate
+        samples time-to-open; reading the body (and however long the consumer
+        takes between chunks) neither holds a slot nor counts against
+        latency_target.
+        """
+        start = time.monotonic()
+        cache_key = self._cache_key(system_prompt, input_prompt)
+        if cache_key is not None:
+            cached = self.cache.get_response(cache_key)
+            if cached is not None:
+                self._record_usage(stage, start, retries=0, cache_hit=True)
+                yield cached
+                return
+
+        estimated_tokens = estimate_tokens(system_prompt, input_prompt)
+        for attempt in range(self.max_retries):
+            parts = []
+            try:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.acquire(self.model, estimated_tokens)
+                with self.concurrency.slot() if self.concurrency else NULL_SLOT:
+                    stream = self.client.chat.completions.create(
+                        model=self.model,
+                        messages=self._messages(system_prompt, input_prompt),
+                        max_tokens=self.max_tokens,
+                        temperature=self.temperature,
+                        stream=True,
+                        **self._stream_options()
+                    )
+                last_chunk = None
+                try:
+                    for chunk in stream:
+                        last_chunk = chunk
+                        if chunk.choices:
+                            delta = chunk.choices[0].delta.content
+                            if delta:
+                                parts.append(delta)
+                                yield delta
+                finally:
+                    # also when the consumer stops early: free the connection and response body
+                    stream.close()
+                self._reconcile_usage(estimated_tokens, last_chunk)
+                self._record_usage(stage, start, retries=attempt, response=last_chunk)
+                if cache_key is not None:
+                    self.cache.set_response(cache_key, "".join(parts))
+                return
+
+            except Exception as e:
+                logger.warning(f"LLM stream failed (attempt {attempt + 1}/{self.max_retries}): {e}")
+                if parts or attempt == self.max_retries - 1:
+                    self._record_usage(stage, start, retries=attempt, error=True)
+                    raise e
+                if self._disable_stream_usage(e):
+                    continue
+                time.sleep(self.retry_delay * (2 ** attempt))
+
+    async def aclient_stream(self, system_prompt, input_prompt, stage: str = "default") -> AsyncIterator[str]:
+        start = time.monotonic()
+        cache_key = self._cache_key(system_prompt, input_prompt)
+        if cache_key is not None:
+            # SQLite lookups stay off the event loop
+            cached = await asyncio.to_thread(self.cache.get_response, cache_key)
+            if cached is not None:
+                self._record_usage(stage, start, retries=0, cache_hit=True)
+                yield cached
+                return
+
+        estimated_tokens = estimate_tokens(system_prompt, input_prompt)
+        for attempt in range(self.max_retries):
+            parts = []
+            try:
+                if self.rate_limiter is not None:
+                    await self.rate_limiter.aacquire(self.model, estimated_tokens)
+                # slot released once the stream is open, see client_stream
+                async with self.concurrency.aslot() if self.concurrency else NULL_SLOT:
+                    stream = await self.async_client.chat.completions.create(
+                        model=self.model,
+                        messages=self._messages(system_prompt, input_prompt),
+                        max_tokens=self.max_tokens,
+                        temperature=self.temperature,
+                        stream=True,
+                        **self._stream_options()
+                    )
+                last_chunk = None
+                try:
+                    async for chunk in stream:
+                        last_chunk = chunk
+                        if chunk.choices:
+                            delta = chunk.choices[0].delta.content
+                            if delta:
+                                parts.append(delta)
+                                yield delta
+                finally:
+                    await stream.close()
+                self._reconcile_usage(estimated_tokens, last_chunk)
+                self._record_usage(stage, start, retries=attempt, response=last_chunk)
+                if cache_key is not None:
+                    await asyncio.to_thread(self.cache.set_response, cache_key, "".join(parts))
+                return
+
+            except Exception as e:
+                logger.warning(f"LLM stream failed (attempt {attempt + 1}/{self.max_retries}): {e}")
+                if parts or attempt == self.max_retries - 1:
+                    self._record_usage(stage, start, retries=attempt, error=True)
+                    raise e
+                if self._disable_stream_usage(e):
+                    continue
+                await asyncio.sleep(self.retry_delay * (2 ** attempt))
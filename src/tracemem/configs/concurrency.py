@@ -0,0 +1,241 @@
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, Optional
+import asyncio
+import threading
+import time
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+def is_overload_error(error: BaseException) -> bool:
+    """429s and timeouts are congestion signals, other failures are not"""
+    if getattr(error, "status_code", None) == 429:
+        return True
+    if isinstance(error, TimeoutError):
+        return True
+    name = type(error).__name__
+    return "RateLimit" in name or "Timeout" in name
+
+
+class _Waiter:
+    """One blocked acquire; async waiters carry their loop and future"""
+
+    __slots__ = ("loop", "future", "granted")
+
+    def __init__(self, loop=None, future=None):
+        self.loop = loop
+        self.future = future
+        self.granted = False
+
+
+def _resolve(future: "asyncio.Future") -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD gate around outbound API calls.
+
+    The in-flight limit grows by `increase` per limit's worth of successful
+    calls that finish within `latency_target`, and is multiplied by
+    `decrease` on 429s, timeouts or when the recent p95 latency exceeds the
+    target. Cuts are spaced by at least one latency target so one burst of
+    failures only halves the limit once.
+
+    Sync and async callers wait in one FIFO queue; a freed slot is handed to
+    the oldest waiter directly (async waiters are woken on their own loop).
+    """
+
+    def __init__(self,
+                 name: str,
+                 initial_limit: int = 4,
+                 min_limit: int = 1,
+                 max_limit: int = 64,
+                 latency_target: float = 20.0,
+                 increase: float = 1.0,
+                 decrease: float = 0.5,
+                 window: int = 50,
+                 history_size: int = 500):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.increase = increase
+        self.decrease = decrease
+
+        self._limit = float(max(min_limit, min(initial_limit, max_limit)))
+        self._in_flight = 0
+        self._latencies = deque(maxlen=window)
+        self._history = deque(maxlen=history_size)
+        self._last_decrease = 0.0
+        self._waiters: deque = deque()
+        self._condition = threading.Condition()
+        self._record("init")
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def _record(self, reason: str) -> None:
+        self._history.append({"time": time.time(), "limit": int(self._limit), "reason": reason})
+
+    def _p95(self) -> float:
+        if not self._latencies:
+            return 0.0
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    def _admit_now(self) -> bool:
+        # caller holds the condition; queued waiters go first
+        if not self._waiters and self._in_flight < int(self._limit):
+            self._in_flight += 1
+            return True
+        return False
+
+    def _grant(self) -> None:
+        # caller holds the condition; hand free slots to waiters in arrival order
+        woke_sync = False
+        while self._waiters and self._in_flight < int(self._limit):
+            waiter = self._waiters.popleft()
+            self._in_flight += 1
+            waiter.granted = True
+            if waiter.loop is None:
+                woke_sync = True
+                continue
+            try:
+                waiter.loop.call_soon_threadsafe(_resolve, waiter.future)
+            except RuntimeError:
+                # the waiter's loop is closed, nobody will use this slot
+                self._in_flight -= 1
+        if woke_sync:
+            self._condition.notify_all()
+
+    def acquire(self) -> None:
+        with self._condition:
+            if self._admit_now():
+                return
+            waiter = _Waiter()
+            self._waiters.append(waiter)
+            while not waiter.granted:
+                self._condition.wait()
+
+    async def aacquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._condition:
+            if self._admit_now():
+                return
+            waiter = _Waiter(loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter.future
+        except BaseException:
+            with self._condition:
+                if waiter.granted:
+                    # cancelled after the slot was handed over, pass it on
+                    self._in_flight -= 1
+                    self._grant()
+                else:
+                    self._waiters.remove(waiter)
+            raise
+
+    def _decrease(self, reason: str) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < self.latency_target:
+            return
+        self._last_decrease = now
+        self._limit = max(float(self.min_limit), self._limit * self.decrease)
+        self._record(reason)
+        logger.info(f"{self.name} concurrency cut to {int(self._limit)} ({reason})")
+
+    def release(self,
+                latency: float,
+                error: Optional[BaseException] = None,
+                sample: bool = True) -> None:
+        """Free a slot; sample=False (cancelled calls) leaves the AIMD state alone"""
+        with self._condition:
+            self._in_flight -= 1
+            if sample:
+                self._adjust(latency, error)
+            self._grant()
+
+    def _adjust(self, latency: float, error: Optional[BaseException]) -> None:
+        if error is not None:
+            if is_overload_error(error):
+                self._decrease(type(error).__name__)
+            return
+        self._latencies.append(latency)
+        if len(self._latencies) >= 10 and self._p95() > self.latency_target:
+            self._decrease("p95")
+        elif latency <= self.latency_target and self._limit < self.max_limit:
+            before = int(self._limit)
+            self._limit = min(float(self.max_limit), self._limit + self.increase / self._limit)
+            if int(self._limit) != before:
+                self._record("increase")
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        start = time.monotonic()
+        error, sample = None, True
+        try:
+            yield
+        except Exception as e:
+            error = e
+            raise
+        except BaseException:
+            # GeneratorExit / KeyboardInterrupt: the call never finished, don't sample it
+            sample = False
+            raise
+        finally:
+            # the slot is always returned, however the block is left
+            self.release(time.monotonic() - start, error=error, sample=sample)
+
+    @asynccontextmanager
+    async def aslot(self):
+        await self.aacquire()
+        start = time.monotonic()
+        error, sample = None, True
+        try:
+            yield
+        except Exception as e:
+            error = e
+            raise
+        except BaseException:
+            # CancelledError (e.g. a cancelled aanswer task) or GeneratorExit
+            sample = False
+            raise
+        finally:
+            self.release(time.monotonic() - start, error=error, sample=sample)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                "name": self.name,
+                "limit": int(self._limit),
+                "in_flight": self._in_flight,
+                "p95_latency": self._p95(),
+                "latency_target": self.latency_target,
+                "history": list(self._history),
+            }
+
+
+class _NullSlot:
+    """Stand-in when no concurrency gate is configured"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+NULL_SLOT = _NullSlot()
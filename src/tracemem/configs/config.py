@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Dict, Any
+from typing import Any, Dict, Optional
 import os
 
 
@@ -10,7 +10,8 @@ class MemoryConfig:
     # === Model Configuration ===
     llm_model: str = "gpt-4o-mini"
     embedding_model: str = "text-embedding-3-small"
-    embedding_dimension: int = 1536
+    embedding_dimension: Optional[int] = None  # None = model's native size; else sent as `dimensions` (text-embedding-3)
+    llm_stream_usage: bool = True    # Send stream_options.include_usage on streams (auto-off if the provider rejects it)
     
     # === Language Configuration ===
     language: str = "en"  # "en" for English, "zh" for Chinese
@@ -21,25 +22,81 @@ class MemoryConfig:
     
     # === Storage / Index Backends ===
     storage_backend: str = "filesystem"         # "filesystem" | "memory"
-    vector_index_backend: str = "chroma"        # "chroma" | "memory"
+    vector_index_backend: str = "chroma"        # "chroma" | "memory" (process-local, lost on exit; not with ingestion_journal_enabled)
     lexical_index_backend: str = "bm25"          # "bm25" | "memory"
 
     # === Vector Database Configuration ===
     vector_db_type: str = "chroma"              # Vector database type: "chroma"
     chroma_persist_directory: str = "./chroma_db"  # ChromaDB persistence directory
     chroma_collection_prefix: str = "tracemem"    # ChromaDB collection name prefix
+    collection_cache_size: int = 256            # Max cached ChromaDB collection handles
+    deterministic_ids: bool = False             # Content-hash ids + upsert writes instead of uuid4 + pre-read
+    vector_store_enabled: bool = False          # Also append vectors to memory-mapped per-collection files
+    vector_store_path: str = "./vector_store"   # Directory of the memory-mapped vector files
+    vector_store_dtype: str = "float16"         # "float16" | "float32"
+    # per memory type vector quantization, only with vector_index_backend="memory"
+    episode_quantization: str = "none"          # "none" | "int8" | "pq"
+    semantic_quantization: str = "none"         # "none" | "int8" | "pq"
+    experience_quantization: str = "none"       # "none" | "int8" | "pq"
+    thread_quantization: str = "none"           # "none" | "int8" | "pq"
+    quantization_rerank: int = 4                # Candidates re-scored exactly = rerank * top_k
+    pq_subspaces: int = 96                      # PQ sub-vectors (bytes per code)
+    pq_train_size: int = 2048                   # Vectors a PQ collection collects before training
+    quantized_vectors_path: str = "./quantized_vectors"  # Parent of a per-process, removed-on-exit dir of full-precision vectors
     
     # === Performance Configuration ===
     batch_size: int = 32                        # Batch size
     max_workers: int = 4                        # Maximum number of worker threads
     semantic_generation_workers: int = 8         # Number of semantic memory generation threads
+    pipeline_queue_size: int = 2                # Max sessions buffered between ingestion stages
+    pipeline_segment_workers: int = 2           # Sessions segmented concurrently
+    pipeline_summary_workers: int = 2           # Sessions summarized concurrently
+    pipeline_extract_workers: int = 2           # Sessions extracted concurrently
+    ingestion_journal_enabled: bool = False     # Checkpoint stages so interrupted ingestion can resume
+    ingestion_journal_path: str = "./cache/ingestion_journal.sqlite"  # SQLite file of the ingestion journal
     
+    # === Rate Limits (0 = unlimited, shared by every client in the process) ===
+    llm_rpm_limit: int = 0                      # Chat completion requests per minute
+    llm_tpm_limit: int = 0                      # Chat completion tokens per minute
+    embedding_rpm_limit: int = 0                # Embedding requests per minute
+    embedding_tpm_limit: int = 0                # Embedding tokens per minute
+
+    # === Adaptive Concurrency (AIMD gate around outbound calls) ===
+    adaptive_concurrency: bool = False          # Gate Client / Embedding calls with an AIMD in-flight limit
+    adaptive_initial_limit: int = 4             # Starting in-flight limit
+    adaptive_max_limit: int = 64                # Upper bound of the in-flight limit
+    llm_latency_target: float = 30.0            # Seconds a chat completion may take before it counts as congestion
+    embedding_latency_target: float = 3.0       # Seconds an embedding call may take before it counts as congestion
+
+    # === Ingestion Mode ===
+    fused_topic_extraction: bool = False        # One LLM call per topic for summary + all speakers' experiences
+    one_shot_ingestion: bool = False            # One LLM call per short session for the whole ingestion
+    one_shot_max_messages: int = 30             # Sessions longer than this use the staged path
+
     # === Cache Configuration ===
     enable_cache: bool = True                   # Enable cache
     cache_size: int = 1000                      # Cache size
     cache_ttl_seconds: int = 3600               # Cache expiration time (seconds)
     semantic_cache_ttl: int = 600               # Semantic cache TTL
     episode_cache_ttl: int = 600                # Episode cache TTL
+    llm_cache_enabled: bool = False             # Persist LLM responses keyed by prompt hash
+    llm_cache_path: str = "./cache/llm_responses.sqlite"  # SQLite file of the LLM response cache
+    llm_cache_max_bytes: int = 512 * 1024 * 1024  # LRU eviction threshold of the LLM response cache
+    embedding_cache_enabled: bool = False       # Persist embeddings keyed by (model, dimension, sha1(text))
+    embedding_cache_path: str = "./cache/embeddings.sqlite"  # SQLite file of the embedding cache
+    embedding_cache_max_bytes: int = 1024 * 1024 * 1024  # LRU eviction threshold of the embedding cache
+
+    # === Answering ===
+    card_router_enabled: bool = True            # Pick cards by name match / card centroids before asking the LLM
+    card_router_margin: float = 0.03            # Min cosine gap between speakers for a confident centroid route
+    speculative_search: bool = True             # Run SEARCH on both cards while the LLM card choice is in flight
+    card_cache_size: int = 1024                 # Parsed cards and router centroids kept in memory (LRU)
+    answer_batch_workers: int = 8               # Concurrent LLM calls in answer_batch
+
+    # === Tracing ===
+    tracing_enabled: bool = False               # Record nested per-stage spans (near-zero cost when off)
+    trace_path: str = "./traces/tracemem.jsonl" # Output file of the span recorder
+    trace_format: str = "jsonl"                 # "jsonl" | "chrome" (trace_event, open in chrome://tracing / Perfetto)
     
     # === Environment Variable Configuration ===
     # openai_api_key: Optional[str] = field(default_factory=lambda: os.getenv("OPENAI_API_KEY"))
@@ -59,6 +116,11 @@ class MemoryConfig:
         
         if self.buffer_size_min >= self.buffer_size_max:
             raise ValueError("Buffer min size must be less than max size")
+
+        if self.vector_index_backend == "memory" and self.ingestion_journal_enabled:
+            # the journal would skip sessions on restart whose vectors died with the last process
+            raise ValueError("ingestion_journal_enabled requires a persistent vector_index_backend, "
+                             "the \"memory\" backend is lost when the process exits")
     
     def to_dict(self) -> Dict[str, Any]:
         """Convert to dictionary"""
@@ -1,11 +1,38 @@
 import openai
+import asyncio
 import time
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass
+from ..cache.sqlite_cache import EmbeddingCache
+from .rate_limiter import RateLimiter, estimate_tokens
+from .concurrency import AdaptiveConcurrencyLimiter, NULL_SLOT
+from .usage import UsageTracker
+from ..utils.tracing import span
+import numpy as np
 import logging
 
 logger = logging.getLogger(__name__)
 
+# native output size of the known embedding models
+_NATIVE_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
+
+
+def truncate_embeddings(vectors, dimension: int) -> List[List[float]]:
+    """
+    Shorten full-size text-embedding-3 vectors to `dimension` and renormalize.
+
+    The models are trained so that a prefix of the vector is itself a usable
+    embedding; this is what the API does server-side for `dimensions`.
+    """
+    matrix = np.array(vectors, dtype=np.float32, ndmin=2)[:, :dimension]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).tolist()
+
 
 @dataclass
 class EmbeddingResponse:
@@ -19,9 +46,17 @@ class EmbeddingResponse:
 class Embedding:
     """Embedding vector client using OpenAI API"""
     
-    def __init__(self, api_key: str, base_url: Optional[str] = "", model: str = "text-embedding-3-small"):
+    def __init__(self, api_key: str, base_url: Optional[str] = "", model: str = "text-embedding-3-small",
+                 cache: Optional[EmbeddingCache] = None,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 concurrency: Optional[AdaptiveConcurrencyLimiter] = None,
+                 usage: Optional[UsageTracker] = None,
+                 dimensions: Optional[int] = None):
         """
         Initialize embedding client
+
+        `dimensions` shortens text-embedding-3 vectors (sent as the API's
+        `dimensions` parameter); None keeps the model's native size.
         """
         self.api_key = api_key
         self.model = model
@@ -30,29 +65,86 @@ class Embedding:
         self.client = openai.OpenAI(
             api_key=self.api_key,
             base_url=self.base_url)
+        self._async_client: Optional[openai.AsyncOpenAI] = None
 
         self.max_retries = 3
         self.retry_delay = 1.0
         self.timeout = 30.0
         self.batch_size = 100 
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.concurrency = concurrency
+        self.usage = usage if usage is not None else UsageTracker()
         
         # Embedding dimension
-        self.embedding_dim = self._get_embedding_dimension()
+        self.native_dim = self._get_embedding_dimension()
+        self.embedding_dim = self._resolve_dimensions(dimensions)
+        self._request_options = {"dimensions": self.embedding_dim} if self.embedding_dim != self.native_dim else {}
     
+    @property
+    def async_client(self) -> openai.AsyncOpenAI:
+        if self._async_client is None:
+            self._async_client = openai.AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url)
+        return self._async_client
+
     def _get_embedding_dimension(self) -> int:
-        """Get embedding dimension"""
-        if "text-embedding-3-small" in self.model:
-            return 1536
-        elif "text-embedding-3-large" in self.model:
-            return 3072
-        elif "text-embedding-ada-002" in self.model:
-            return 1536
-        else:
-            return 1536
+        """Get the model's native embedding dimension"""
+        for model, dimension in _NATIVE_DIMENSIONS.items():
+            if model in self.model:
+                return dimension
+        return 1536
+
+    @property
+    def supports_dimensions(self) -> bool:
+        return "text-embedding-3" in self.model
+
+    def _resolve_dimensions(self, dimensions: Optional[int]) -> int:
+        if dimensions is None or dimensions == self.native_dim:
+            return self.native_dim
+        if not self.supports_dimensions:
+            logger.warning(f"{self.model} does not support reduced dimensions, "
+                           f"using its native {self.native_dim} instead of {dimensions}")
+            return self.native_dim
+        if not 0 < dimensions < self.native_dim:
+            raise ValueError(f"embedding dimension for {self.model} must be in 1..{self.native_dim}, got {dimensions}")
+        return dimensions
+
+    def _cached_vectors(self, texts: List[str]) -> Dict[str, List[float]]:
+        cached = self.cache.get_vectors(self.model, self.embedding_dim, texts)
+        if self.embedding_dim == self.native_dim:
+            return cached
+        # full-size vectors cached before the dimension was reduced are truncated locally
+        remaining = [t for t in texts if t not in cached]
+        full_size = self.cache.get_vectors(self.model, self.native_dim, remaining) if remaining else {}
+        if full_size:
+            reduced = dict(zip(full_size, truncate_embeddings(list(full_size.values()), self.embedding_dim)))
+            self.cache.set_vectors(self.model, self.embedding_dim, reduced)
+            cached.update(reduced)
+        return cached
     
+    def _split_cached(self, texts: List[str]) -> Tuple[List[str], Dict[str, List[float]], List[str]]:
+        # returns cleaned inputs, vectors served from cache and the unique texts still to embed
+        cleaned = [str(t).replace("\n", " ") for t in texts]
+        cached = self._cached_vectors(cleaned) if self.cache else {}
+        misses = list(dict.fromkeys(t for t in cleaned if t not in cached))
+        return cleaned, cached, misses
+
+    def _merge_cached(self,
+                      cleaned: List[str],
+                      cached: Dict[str, List[float]],
+                      misses: List[str],
+                      fresh: List[List[float]]) -> List[List[float]]:
+        fresh_vectors = dict(zip(misses, fresh))
+        if self.cache is not None and fresh_vectors:
+            self.cache.set_vectors(self.model, self.embedding_dim, fresh_vectors)
+        vectors = {**cached, **fresh_vectors}
+        return [vectors[t] for t in cleaned]
+
     def embed_texts(self, texts: List[str]) -> 'EmbeddingResponse':
         """
-        Generate embedding vectors via OpenAI API
+        Generate embedding vectors via OpenAI API, cached texts are not sent
         """
         if not texts:
             return EmbeddingResponse(
@@ -63,18 +155,28 @@ class Embedding:
             )
         
         start_time = time.time()
+        cleaned, cached, misses = self._split_cached(texts)
+        if not misses:
+            self.usage.record("embed", latency=time.time() - start_time, cache_hit=True)
         all_embeddings = []
         total_usage = {"prompt_tokens": 0, "total_tokens": 0}
         
-        for i in range(0, len(texts), self.batch_size):
-            batch = [str(t).replace("\n", " ") for t in texts[i:i + self.batch_size]]
+        for i in range(0, len(misses), self.batch_size):
+            batch = misses[i:i + self.batch_size]
+            estimated_tokens = estimate_tokens(*batch)
+            batch_start = time.monotonic()
             
             for attempt in range(self.max_retries):
                 try:
-                    response = self.client.embeddings.create(
-                        model=self.model,
-                        input=batch,
-                        timeout=self.timeout)
+                    if self.rate_limiter is not None:
+                        self.rate_limiter.acquire(self.model, estimated_tokens)
+                    with self.concurrency.slot() if self.concurrency else NULL_SLOT:
+                        with span("embed", model=self.model, texts=len(batch), attempt=attempt):
+                            response = self.client.embeddings.create(
+                                model=self.model,
+                                input=batch,
+                                timeout=self.timeout,
+                                **self._request_options)
 
                     batch_embeddings = [data.embedding for data in response.data]
                     all_embeddings.extend(batch_embeddings)
@@ -83,6 +185,13 @@ class Embedding:
                         usage = response.usage
                         total_usage["prompt_tokens"] += getattr(usage, "prompt_tokens", 0)
                         total_usage["total_tokens"] += getattr(usage, "total_tokens", 0)
+                        if self.rate_limiter is not None:
+                            self.rate_limiter.reconcile(self.model, estimated_tokens, getattr(usage, "total_tokens", 0))
+                    self.usage.record("embed",
+                                      latency=time.monotonic() - batch_start,
+                                      prompt_tokens=getattr(response.usage, "prompt_tokens", 0) or 0,
+                                      total_tokens=getattr(response.usage, "total_tokens", None),
+                                      retries=attempt)
                     break 
                     
                 except Exception as e:
@@ -90,12 +199,14 @@ class Embedding:
                     if attempt < self.max_retries - 1:
                         time.sleep(self.retry_delay * (2 ** attempt))
                     else:
+                        self.usage.record("embed", latency=time.monotonic() - batch_start,
+                                          retries=attempt, error=True)
                         raise e
         
         response_time = time.time() - start_time
         
         return EmbeddingResponse(
-            embeddings=all_embeddings,
+            embeddings=self._merge_cached(cleaned, cached, misses, all_embeddings),
             usage=total_usage,
             model=self.model,
             response_time=response_time)
@@ -103,4 +214,81 @@ class Embedding:
     def embed_text(self, text: str) -> List[float]:
         response = self.embed_texts([text])
         return response.embeddings[0] if response.embeddings else []
-    
\ No newline at end of file
+
+    async def aembed_texts(self, texts: List[str]) -> 'EmbeddingResponse':
+        """
+        Async variant of embed_texts built on AsyncOpenAI
+        """
+        if not texts:
+            return EmbeddingResponse(
+                embeddings=[],
+                usage={},
+                model=self.model,
+                response_time=0.0
+            )
+
+        start_time = time.time()
+        # SQLite cache reads and writes run in a worker thread, not on the event loop
+        if self.cache is not None:
+            cleaned, cached, misses = await asyncio.to_thread(self._split_cached, texts)
+        else:
+            cleaned, cached, misses = self._split_cached(texts)
+        if not misses:
+            self.usage.record("embed", latency=time.time() - start_time, cache_hit=True)
+        all_embeddings = []
+        total_usage = {"prompt_tokens": 0, "total_tokens": 0}
+
+        for i in range(0, len(misses), self.batch_size):
+            batch = misses[i:i + self.batch_size]
+            estimated_tokens = estimate_tokens(*batch)
+            batch_start = time.monotonic()
+
+            for attempt in range(self.max_retries):
+                try:
+                    if self.rate_limiter is not None:
+                        await self.rate_limiter.aacquire(self.model, estimated_tokens)
+                    async with self.concurrency.aslot() if self.concurrency else NULL_SLOT:
+                        with span("embed", model=self.model, texts=len(batch), attempt=attempt):
+                            response = await self.async_client.embeddings.create(
+                                model=self.model,
+                                input=batch,
+                                timeout=self.timeout,
+                                **self._request_options)
+
+                    all_embeddings.extend(data.embedding for data in response.data)
+
+                    if response.usage:
+                        usage = response.usage
+                        total_usage["prompt_tokens"] += getattr(usage, "prompt_tokens", 0)
+                        total_usage["total_tokens"] += getattr(usage, "total_tokens", 0)
+                        if self.rate_limiter is not None:
+                            self.rate_limiter.reconcile(self.model, estimated_tokens, getattr(usage, "total_tokens", 0))
+                    self.usage.record("embed",
+                                      latency=time.monotonic() - batch_start,
+                                      prompt_tokens=getattr(response.usage, "prompt_tokens", 0) or 0,
+                                      total_tokens=getattr(response.usage, "total_tokens", None),
+                                      retries=attempt)
+                    break
+
+                except Exception as e:
+                    logger.warning(f"Embedding API call failed (attempt {attempt + 1}/{self.max_retries}): {e}")
+                    if attempt < self.max_retries - 1:
+                        await asyncio.sleep(self.retry_delay * (2 ** attempt))
+                    else:
+                        self.usage.record("embed", latency=time.monotonic() - batch_start,
+                                          retries=attempt, error=True)
+                        raise e
+
+        if self.cache is not None:
+            embeddings = await asyncio.to_thread(self._merge_cached, cleaned, cached, misses, all_embeddings)
+        else:
+            embeddings = self._merge_cached(cleaned, cached, misses, all_embeddings)
+        return EmbeddingResponse(
+            embeddings=embeddings,
+            usage=total_usage,
+            model=self.model,
+            response_time=time.time() - start_time)
+
+    async def aembed_text(self, text: str) -> List[float]:
+        response = await self.aembed_texts([text])
+        return response.embeddings[0] if response.embeddings else []
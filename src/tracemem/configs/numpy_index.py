@@ -0,0 +1,257 @@
+from typing import Any, Dict, List, Optional, Sequence
+import threading
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+_DEFAULT_INCLUDE = ("documents", "metadatas", "distances")
+
+
+class NumpyCollection:
+    """
+    In-process vector collection with the subset of the Chroma collection API
+    ChromaEngine uses (count / add / upsert / get / query / delete).
+
+    Vectors are L2-normalized on insert and kept in one contiguous float32
+    matrix that grows by doubling; ids, documents and metadatas live in
+    parallel lists indexed by row. query() is an exact brute-force matmul
+    with argpartition top-k. Distances are squared L2 between unit vectors
+    (2 - 2 * cosine), which is what Chroma's default space reports for the
+    unit-norm OpenAI embeddings, so `score = 1 - distance` keeps its meaning.
+    """
+
+    def __init__(self, name: str, metadata: Optional[Dict[str, Any]] = None, initial_capacity: int = 64):
+        self.name = name
+        self.metadata = metadata or {}
+        self._initial_capacity = initial_capacity
+        self._vectors: Optional[np.ndarray] = None
+        self._size = 0
+        self._ids: List[str] = []
+        self._documents: List[Optional[str]] = []
+        self._metadatas: List[Optional[Dict[str, Any]]] = []
+        self._rows: Dict[str, int] = {}
+        self._lock = threading.RLock()
+
+    @property
+    def dimension(self) -> Optional[int]:
+        return None if self._vectors is None else self._vectors.shape[1]
+
+    def count(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _normalize(vectors: Any) -> np.ndarray:
+        vectors = np.array(vectors, dtype=np.float32, ndmin=2)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _reserve(self, extra: int, dimension: int) -> None:
+        needed = self._size + extra
+        if self._vectors is None:
+            self._vectors = np.empty((max(self._initial_capacity, needed), dimension), dtype=np.float32)
+            return
+        if dimension != self._vectors.shape[1]:
+            raise ValueError(f"Collection {self.name} expects dimension {self._vectors.shape[1]}, got {dimension}")
+        capacity = self._vectors.shape[0]
+        if needed > capacity:
+            # amortized doubling keeps appends O(1) per vector
+            grown = np.empty((max(needed, capacity * 2), dimension), dtype=np.float32)
+            grown[:self._size] = self._vectors[:self._size]
+            self._vectors = grown
+
+    def _write(self,
+               ids: Sequence[str],
+               embeddings: Any,
+               documents: Optional[Sequence[str]],
+               metadatas: Optional[Sequence[Dict[str, Any]]],
+               overwrite: bool) -> None:
+        vectors = self._normalize(embeddings)
+        if len(vectors) != len(ids):
+            raise ValueError(f"Got {len(ids)} ids but {len(vectors)} embeddings")
+        documents = list(documents) if documents is not None else [None] * len(ids)
+        metadatas = list(metadatas) if metadatas is not None else [None] * len(ids)
+
+        with self._lock:
+            self._reserve(len(ids), vectors.shape[1])
+            rows, written = [], []
+            for idx, (record_id, document, metadata) in enumerate(zip(ids, documents, metadatas)):
+                row = self._rows.get(record_id)
+                if row is None:
+                    row = self._size
+                    self._size += 1
+                    self._rows[record_id] = row
+                    self._ids.append(record_id)
+                    self._documents.append(document)
+                    self._metadatas.append(metadata)
+                elif not overwrite:
+                    logger.debug(f"Id {record_id} already exists in {self.name}, ignore")
+                    continue
+                else:
+                    self._documents[row] = document
+                    self._metadatas[row] = metadata
+                rows.append(row)
+                written.append(idx)
+            if rows:
+                self._set_rows(np.asarray(rows), [ids[idx] for idx in written], vectors[written])
+
+    # --- vector storage hooks, overridden by quantized collections ---
+
+    def _set_rows(self, rows: np.ndarray, ids: List[str], vectors: np.ndarray) -> None:
+        self._vectors[rows] = vectors
+
+    def _row_vectors(self, rows: List[int]) -> np.ndarray:
+        if self._vectors is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return self._vectors[rows]
+
+    def _top_k(self, queries: np.ndarray, k: int):
+        # exact cosine over all rows -> (rows, scores) per query, best first
+        size = self._size
+        scores = queries @ self._vectors[:size].T
+        if k < size:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(size), (len(queries), size))
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+    def _compact(self, keep: List[int]) -> None:
+        self._vectors[:len(keep)] = self._vectors[keep]
+
+    def add(self, ids, embeddings, documents=None, metadatas=None) -> None:
+        self._write(ids, embeddings, documents, metadatas, overwrite=False)
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None) -> None:
+        self._write(ids, embeddings, documents, metadatas, overwrite=True)
+
+    def get(self, ids: Optional[Sequence[str]] = None, include=("documents", "metadatas")) -> Dict[str, Any]:
+        with self._lock:
+            if ids is None:
+                rows = list(range(self._size))
+            else:
+                rows = [self._rows[record_id] for record_id in ids if record_id in self._rows]
+            vectors = self._row_vectors(rows) if "embeddings" in include else None
+            return {
+                "ids": [self._ids[row] for row in rows],
+                "documents": [self._documents[row] for row in rows] if "documents" in include else None,
+                "metadatas": [self._metadatas[row] for row in rows] if "metadatas" in include else None,
+                "embeddings": vectors,
+            }
+
+    def peek(self, limit: int = 10) -> Dict[str, Any]:
+        with self._lock:
+            rows = list(range(min(limit, self._size)))
+            return {
+                "ids": [self._ids[row] for row in rows],
+                "documents": [self._documents[row] for row in rows],
+                "metadatas": [self._metadatas[row] for row in rows],
+                "embeddings": self._row_vectors(rows),
+            }
+
+    def query(self, query_embeddings, n_results: int = 10, include=_DEFAULT_INCLUDE) -> Dict[str, Any]:
+        queries = self._normalize(query_embeddings)
+        with self._lock:
+            size = self._size
+            k = min(n_results, size)
+            if k <= 0:
+                empty = [[] for _ in queries]
+                return {"ids": empty, "documents": empty, "metadatas": empty, "distances": empty, "embeddings": None}
+
+            top, top_scores = self._top_k(queries, k)
+            distances = np.maximum(0.0, 2.0 - 2.0 * top_scores)
+
+            return {
+                "ids": [[self._ids[row] for row in rows] for rows in top],
+                "documents": [[self._documents[row] for row in rows] for rows in top] if "documents" in include else None,
+                "metadatas": [[self._metadatas[row] for row in rows] for rows in top] if "metadatas" in include else None,
+                "distances": distances.tolist() if "distances" in include else None,
+                "embeddings": None,
+            }
+
+    def delete(self, ids: Sequence[str]) -> None:
+        with self._lock:
+            drop = {self._rows[record_id] for record_id in ids if record_id in self._rows}
+            if not drop:
+                return
+            keep = [row for row in range(self._size) if row not in drop]
+            self._compact(keep)
+            self._ids = [self._ids[row] for row in keep]
+            self._documents = [self._documents[row] for row in keep]
+            self._metadatas = [self._metadatas[row] for row in keep]
+            self._size = len(keep)
+            self._rows = {record_id: row for row, record_id in enumerate(self._ids)}
+
+
+class NumpyVectorClient:
+    """
+    Stand-in for chromadb.PersistentClient holding NumpyCollections in memory.
+
+    `quantization` maps a collection's metadata "type" to "int8" or "pq";
+    those collections keep compact codes in memory and their full vectors
+    in `vector_store` (see configs/quantization.py).
+    """
+
+    def __init__(self,
+                 quantization: Optional[Dict[str, str]] = None,
+                 vector_store=None,
+                 rerank: int = 4,
+                 pq_subspaces: int = 96,
+                 pq_train_size: int = 2048):
+        self.quantization = {kind: mode for kind, mode in (quantization or {}).items() if mode != "none"}
+        if self.quantization and vector_store is None:
+            raise ValueError("Quantized collections need a vector_store for the full-precision vectors")
+        self.vector_store = vector_store
+        self.rerank = rerank
+        self.pq_subspaces = pq_subspaces
+        self.pq_train_size = pq_train_size
+        self._collections: Dict[str, NumpyCollection] = {}
+        self._lock = threading.Lock()
+
+    def _new_collection(self, name: str, metadata: Optional[Dict[str, Any]]) -> NumpyCollection:
+        mode = self.quantization.get((metadata or {}).get("type"))
+        if mode is None:
+            return NumpyCollection(name, metadata)
+        from .quantization import QuantizedCollection
+        # the collection starts empty; the store must be private to this client
+        # (ChromaEngine gives it a per-process directory), stale files of a
+        # re-created collection are discarded
+        self.vector_store.drop(name)
+        return QuantizedCollection(name, metadata, mode, self.vector_store,
+                                   rerank=self.rerank,
+                                   pq_subspaces=self.pq_subspaces,
+                                   train_size=self.pq_train_size)
+
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None) -> NumpyCollection:
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = self._new_collection(name, metadata)
+            return self._collections[name]
+
+    def get_collection(self, name: str) -> NumpyCollection:
+        with self._lock:
+            if name not in self._collections:
+                raise ValueError(f"Collection {name} does not exist")
+            return self._collections[name]
+
+    def delete_collection(self, name: str) -> None:
+        with self._lock:
+            collection = self._collections.pop(name, None)
+            if collection is None:
+                raise ValueError(f"Collection {name} does not exist")
+            if getattr(collection, "store", None) is not None:
+                collection.store.drop(name)
+
+    def list_collections(self) -> List[NumpyCollection]:
+        with self._lock:
+            return list(self._collections.values())
+
+    def reset(self) -> bool:
+        with self._lock:
+            for name, collection in self._collections.items():
+                if getattr(collection, "store", None) is not None:
+                    collection.store.drop(name)
+            self._collections.clear()
+        return True
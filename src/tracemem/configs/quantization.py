@@ -0,0 +1,212 @@
+from typing import Any, Dict, List, Optional
+import numpy as np
+from .numpy_index import NumpyCollection
+from ..storage.vector_store import MmapVectorStore
+
+import logging
+logger = logging.getLogger(__name__)
+
+QUANTIZATION_MODES = ("none", "int8", "pq")
+
+# rows converted to float32 at a time while scanning codes
+_SCAN_ROWS = 16384
+
+
+class Int8Quantizer:
+    """Scalar quantization: int8 codes with one float32 scale per vector"""
+
+    trained = True
+
+    def code_shape(self, dimension: int) -> int:
+        return dimension
+
+    code_dtype = np.int8
+
+    def encode(self, vectors: np.ndarray):
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def scores(self, queries: np.ndarray, codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+        out = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), _SCAN_ROWS):
+            chunk = codes[start:start + _SCAN_ROWS].astype(np.float32)
+            out[:, start:start + len(chunk)] = (queries @ chunk.T) * scales[start:start + len(chunk)]
+        return out
+
+
+class ProductQuantizer:
+    """
+    Product quantization: the vector is split into `subspaces` slices and each
+    slice is replaced by the uint8 id of its nearest k-means centroid.
+    Queries are scored with per-subspace lookup tables (asymmetric distance).
+    """
+
+    code_dtype = np.uint8
+
+    def __init__(self, subspaces: int = 96, centroids: int = 256, iterations: int = 15, seed: int = 0):
+        self.subspaces = subspaces
+        self.centroids = min(centroids, 256)
+        self.iterations = iterations
+        self.seed = seed
+        self.codebooks: Optional[np.ndarray] = None   # (subspaces, centroids, sub_dim)
+
+    @property
+    def trained(self) -> bool:
+        return self.codebooks is not None
+
+    def code_shape(self, dimension: int) -> int:
+        # fall back to the largest subspace count that divides the dimension
+        while dimension % self.subspaces:
+            self.subspaces -= 1
+        return self.subspaces
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        # (n, d) -> (subspaces, n, sub_dim)
+        return vectors.reshape(len(vectors), self.subspaces, -1).transpose(1, 0, 2)
+
+    @staticmethod
+    def _assign(points: np.ndarray, centers: np.ndarray) -> np.ndarray:
+        distances = (centers ** 2).sum(axis=1)[None, :] - 2.0 * points @ centers.T
+        return distances.argmin(axis=1)
+
+    def train(self, vectors: np.ndarray) -> None:
+        self.code_shape(vectors.shape[1])
+        rng = np.random.default_rng(self.seed)
+        k = min(self.centroids, len(vectors))
+        codebooks = []
+        for points in self._split(vectors):
+            centers = points[rng.choice(len(points), size=k, replace=False)].copy()
+            for _ in range(self.iterations):
+                labels = self._assign(points, centers)
+                sums = np.zeros_like(centers)
+                np.add.at(sums, labels, points)
+                counts = np.bincount(labels, minlength=k)
+                filled = counts > 0
+                centers[filled] = sums[filled] / counts[filled, None]
+            codebooks.append(centers)
+        self.codebooks = np.stack(codebooks).astype(np.float32)
+
+    def encode(self, vectors: np.ndarray):
+        codes = np.stack([self._assign(points, centers)
+                          for points, centers in zip(self._split(vectors), self.codebooks)], axis=1)
+        return codes.astype(np.uint8), None
+
+    def scores(self, queries: np.ndarray, codes: np.ndarray, scales=None) -> np.ndarray:
+        # tables[q, j, c] = <query slice j, centroid c of subspace j>
+        tables = np.einsum("jqs,jcs->qjc", self._split(queries), self.codebooks)
+        out = np.empty((len(queries), len(codes)), dtype=np.float32)
+        columns = np.arange(self.subspaces)
+        for start in range(0, len(codes), _SCAN_ROWS):
+            chunk = codes[start:start + _SCAN_ROWS]
+            for q in range(len(queries)):
+                out[q, start:start + len(chunk)] = tables[q][columns, chunk].sum(axis=1)
+        return out
+
+
+class QuantizedCollection(NumpyCollection):
+    """
+    NumpyCollection that keeps only compact codes in memory.
+
+    Full-precision (float32, unit-norm) vectors are appended to an on-disk
+    MmapVectorStore. A query scans the codes for `rerank * k` candidates and
+    re-scores those exactly from the memory-mapped vectors. A PQ collection
+    searches the stored vectors exactly until `train_size` vectors exist,
+    then trains its codebooks once and encodes everything.
+    """
+
+    def __init__(self,
+                 name: str,
+                 metadata: Optional[Dict[str, Any]],
+                 mode: str,
+                 store: MmapVectorStore,
+                 rerank: int = 4,
+                 pq_subspaces: int = 96,
+                 train_size: int = 2048):
+        super().__init__(name, metadata)
+        if mode not in ("int8", "pq"):
+            raise ValueError(f"Unknown quantization mode {mode!r}")
+        self.mode = mode
+        self.store = store
+        self.rerank = max(1, rerank)
+        self.train_size = train_size
+        self.quantizer = Int8Quantizer() if mode == "int8" else ProductQuantizer(subspaces=pq_subspaces)
+        self._dimension: Optional[int] = None
+        self._codes: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+
+    @property
+    def dimension(self) -> Optional[int]:
+        return self._dimension
+
+    @property
+    def nbytes(self) -> int:
+        """Resident bytes of the vector codes (the full vectors live on disk)"""
+        if self._codes is None:
+            return 0
+        nbytes = self._codes[:self._size].nbytes
+        return nbytes + (self._scales[:self._size].nbytes if self.mode == "int8" else 0)
+
+    def _reserve(self, extra: int, dimension: int) -> None:
+        if self._dimension is None:
+            self._dimension = dimension
+        elif dimension != self._dimension:
+            raise ValueError(f"Collection {self.name} expects dimension {self._dimension}, got {dimension}")
+        needed = self._size + extra
+        capacity = 0 if self._codes is None else len(self._codes)
+        if needed > capacity:
+            capacity = max(needed, capacity * 2, self._initial_capacity)
+            codes = np.zeros((capacity, self.quantizer.code_shape(dimension)), dtype=self.quantizer.code_dtype)
+            scales = np.zeros(capacity, dtype=np.float32)
+            if self._codes is not None:
+                codes[:len(self._codes)] = self._codes
+                scales[:len(self._scales)] = self._scales
+            self._codes, self._scales = codes, scales
+
+    def _encode_rows(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        codes, scales = self.quantizer.encode(vectors)
+        self._codes[rows] = codes
+        if scales is not None:
+            self._scales[rows] = scales
+
+    def _set_rows(self, rows: np.ndarray, ids: List[str], vectors: np.ndarray) -> None:
+        self.store.append(self.name, ids, vectors)
+        if self.quantizer.trained:
+            self._encode_rows(rows, vectors)
+        elif self._size >= self.train_size:
+            every = self._row_vectors(list(range(self._size)))
+            self.quantizer.train(every)
+            self._encode_rows(np.arange(self._size), every)
+            logger.info(f"Trained PQ codebooks for {self.name} on {self._size} vectors")
+
+    def _row_vectors(self, rows: List[int]) -> np.ndarray:
+        if not rows:
+            return np.empty((0, self._dimension or 0), dtype=np.float32)
+        return np.asarray(self.store.get(self.name, [self._ids[row] for row in rows]), dtype=np.float32)
+
+    def _exact(self, queries: np.ndarray, candidates: np.ndarray, k: int):
+        rows, scores = [], []
+        for query, candidate_rows in zip(queries, candidates):
+            exact = self._row_vectors(list(candidate_rows)) @ query
+            order = np.argsort(-exact)[:k]
+            rows.append(candidate_rows[order])
+            scores.append(exact[order])
+        return np.array(rows), np.array(scores, dtype=np.float32)
+
+    def _top_k(self, queries: np.ndarray, k: int):
+        size = self._size
+        if not self.quantizer.trained:
+            return self._exact(queries, np.broadcast_to(np.arange(size), (len(queries), size)), k)
+
+        approximate = self.quantizer.scores(queries, self._codes[:size], self._scales[:size])
+        n_candidates = min(size, k * self.rerank)
+        if n_candidates < size:
+            candidates = np.argpartition(-approximate, n_candidates - 1, axis=1)[:, :n_candidates]
+        else:
+            candidates = np.broadcast_to(np.arange(size), (len(queries), size))
+        return self._exact(queries, candidates, k)
+
+    def _compact(self, keep: List[int]) -> None:
+        # stored full vectors are append-only; only the in-memory codes are compacted
+        self._codes[:len(keep)] = self._codes[keep]
+        self._scales[:len(keep)] = self._scales[keep]
@@ -0,0 +1,107 @@
+from typing import Dict, Optional, Tuple
+import asyncio
+import threading
+import time
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(*texts: str) -> int:
+    """Rough token count (about 4 characters per token), good enough for quota pacing"""
+    return max(1, sum(len(text or "") for text in texts) // 4)
+
+
+class TokenBucket:
+    """
+    Continuous-refill token bucket.
+
+    reserve() debits immediately (the level may go negative) and returns how
+    long the caller must wait before sending, so concurrent callers queue up
+    fairly without holding the lock while sleeping.
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        amount = min(float(amount), self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            self.level -= amount
+            return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def adjust(self, amount: float) -> None:
+        # positive returns tokens, negative charges extra (estimate vs real usage)
+        with self._lock:
+            self._refill(time.monotonic())
+            self.level = min(self.capacity, self.level + amount)
+
+
+class RateLimiter:
+    """Process-wide requests-per-minute / tokens-per-minute limiter keyed by model"""
+
+    _shared: Optional["RateLimiter"] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[Optional[TokenBucket], Optional[TokenBucket]]] = {}
+        self._limits: Dict[str, Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls) -> "RateLimiter":
+        if cls._shared is None:
+            with cls._shared_lock:
+                if cls._shared is None:
+                    cls._shared = cls()
+        return cls._shared
+
+    def configure(self, model: str, rpm: int = 0, tpm: int = 0) -> None:
+        """Set the limits of a model, 0 disables the corresponding bucket"""
+        with self._lock:
+            # keep the live buckets when another instance re-applies the same limits
+            if self._limits.get(model) == (rpm, tpm):
+                return
+            self._limits[model] = (rpm, tpm)
+            self._buckets[model] = (TokenBucket(rpm) if rpm > 0 else None,
+                                    TokenBucket(tpm) if tpm > 0 else None)
+
+    def _reserve(self, model: str, tokens: int) -> float:
+        rpm_bucket, tpm_bucket = self._buckets.get(model, (None, None))
+        wait = 0.0
+        if rpm_bucket is not None:
+            wait = max(wait, rpm_bucket.reserve(1))
+        if tpm_bucket is not None:
+            wait = max(wait, tpm_bucket.reserve(tokens))
+        return wait
+
+    def acquire(self, model: str, tokens: int) -> float:
+        wait = self._reserve(model, tokens)
+        if wait > 0:
+            logger.debug(f"Rate limiter delaying {model} call by {wait:.2f}s")
+            time.sleep(wait)
+        return wait
+
+    async def aacquire(self, model: str, tokens: int) -> float:
+        wait = self._reserve(model, tokens)
+        if wait > 0:
+            logger.debug(f"Rate limiter delaying {model} call by {wait:.2f}s")
+            await asyncio.sleep(wait)
+        return wait
+
+    def reconcile(self, model: str, estimated: int, actual: Optional[int]) -> None:
+        """Correct the token bucket once the real usage of a call is known"""
+        if not actual:
+            return
+        _, tpm_bucket = self._buckets.get(model, (None, None))
+        if tpm_bucket is not None:
+            tpm_bucket.adjust(estimated - actual)
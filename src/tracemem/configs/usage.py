@@ -0,0 +1,78 @@
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Any, Dict, Optional
+import threading
+
+# upper bounds (seconds) of the latency histogram buckets, the last bucket is open
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+
+def _empty_stage() -> Dict[str, Any]:
+    return {
+        "calls": 0,
+        "errors": 0,
+        "retries": 0,
+        "cache_hits": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "total_tokens": 0,
+        "latency_sum": 0.0,
+        "latency_max": 0.0,
+        "latency_histogram": [0] * (len(LATENCY_BUCKETS) + 1),
+    }
+
+
+class UsageTracker:
+    """Thread-safe per-stage accounting of calls, tokens, retries and latency"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Dict[str, Any]] = defaultdict(_empty_stage)
+
+    def record(self,
+               stage: str,
+               latency: float,
+               prompt_tokens: int = 0,
+               completion_tokens: int = 0,
+               total_tokens: Optional[int] = None,
+               retries: int = 0,
+               error: bool = False,
+               cache_hit: bool = False) -> None:
+        with self._lock:
+            stats = self._stages[stage]
+            stats["calls"] += 1
+            stats["errors"] += int(error)
+            stats["retries"] += retries
+            stats["cache_hits"] += int(cache_hit)
+            stats["prompt_tokens"] += prompt_tokens or 0
+            stats["completion_tokens"] += completion_tokens or 0
+            stats["total_tokens"] += total_tokens if total_tokens is not None else (prompt_tokens or 0) + (completion_tokens or 0)
+            stats["latency_sum"] += latency
+            stats["latency_max"] = max(stats["latency_max"], latency)
+            stats["latency_histogram"][bisect_left(LATENCY_BUCKETS, latency)] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Copy of the per-stage counters plus a `total` row"""
+        with self._lock:
+            stages = {stage: {**stats, "latency_histogram": list(stats["latency_histogram"])}
+                      for stage, stats in self._stages.items()}
+
+        total = _empty_stage()
+        for stats in stages.values():
+            for key, value in stats.items():
+                if key == "latency_histogram":
+                    total[key] = [a + b for a, b in zip(total[key], value)]
+                elif key == "latency_max":
+                    total[key] = max(total[key], value)
+                else:
+                    total[key] += value
+        for stats in list(stages.values()) + [total]:
+            stats["latency_mean"] = stats["latency_sum"] / stats["calls"] if stats["calls"] else 0.0
+
+        return {"stages": stages,
+                "total": total,
+                "latency_buckets": list(LATENCY_BUCKETS) + ["inf"]}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
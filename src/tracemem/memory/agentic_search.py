@@ -1,111 +1,518 @@
-from typing import List
+from typing import AsyncIterator, Callable, Iterator, List, Optional
 from .prompts import USER_PROMPT, ANSWER_PROMPT, SEARCH_PROMPT
 from ..configs.client import Client
 from ..configs.config import MemoryConfig
-from ..configs.chroma import ChromaEngine
+from ..configs.chroma import ChromaEngine, AsyncChromaEngine
+from ..utils.tracing import traced
+from .card_router import CardRouter
+from ..cache.card_cache import CardCache
+from ..utils.parallel import ordered_map, ParallelTaskError
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
+import inspect
 import json
 import os
+import threading
+import time
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+def _map_keep_going(func: Callable, items, max_workers: int, stage: str) -> List:
+    # ordered_map, but a failed item leaves None in its slot instead of losing the rest
+    try:
+        return ordered_map(func, items, max_workers=max_workers)
+    except ParallelTaskError as e:
+        for idx, error in sorted(e.errors.items()):
+            logger.error(f"Item {idx} failed in {stage}: {type(error).__name__}: {error}")
+        return e.results
+
+
+class StageTimer:
+    """Reports the seconds spent in each answering stage to an optional callback"""
+
+    def __init__(self, on_stage: Optional[Callable[[str, float], None]] = None):
+        self.on_stage = on_stage
+        self.timings = {}
+        self._last = time.monotonic()
+
+    def mark(self, stage: str) -> None:
+        now = time.monotonic()
+        self.timings[stage] = now - self._last
+        self._last = now
+        if self.on_stage is not None:
+            self.on_stage(stage, self.timings[stage])
+
 
 class AgentReason:
-    def __init__(self, llm_client:Client, config:MemoryConfig, backend:ChromaEngine):
+    def __init__(self, llm_client:Client, config:MemoryConfig, backend:ChromaEngine,
+                 card_cache: Optional[CardCache] = None):
         self.llm_client = llm_client
         self.config = config
         self.backend = backend
+        self.async_backend = AsyncChromaEngine(backend)
+        self.card_cache = card_cache if card_cache is not None else CardCache(max_entries=config.card_cache_size)
+        self.card_router = CardRouter(embedding_client=backend.embedding_client,
+                                      margin=config.card_router_margin,
+                                      card_cache=self.card_cache,
+                                      max_entries=config.card_cache_size) if config.card_router_enabled else None
+        self._executor = None
+        self._executor_lock = threading.Lock()
 
-    def choose_card(self, 
-                    question: str,
-                    speakers: List[str]):
-        
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        # background retrieval that overlaps the card choice / search LLM calls
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.config.max_workers,
+                                                        thread_name_prefix="tracemem-retrieve")
+        return self._executor
+
+    def _card_choice_prompt(self,
+                            question: str,
+                            speakers: List[str]):
         conv_users = ",".join(speakers)
-        input_prompt = f"Question: {question}\nUsers in the conversation: {conv_users}"
-        card_choice = self.llm_client.client_response(
-            system_prompt=USER_PROMPT,
-            input_prompt=input_prompt) 
-        
-        try:
-            user_cards = json.loads(card_choice)
-        except json.JSONDecodeError as e:
-            print(f"Error {e} in card choice...")
+        return f"Question: {question}\nUsers in the conversation: {conv_users}"
 
+    def _card_paths(self,
+                    speakers: List[str],
+                    users: List[str]) -> List[str]:
         roles = f"{speakers[0]}_{speakers[1]}"
+        return [os.path.join(self.config.cards_dir, f"{roles}_{user}.json") for user in users]
 
-        choice = user_cards['choice']
+    def _parse_card_choice(self,
+                           card_choice: str,
+                           speakers: List[str]):
+        try:
+            choice = json.loads(card_choice)['choice']
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            print(f"Error {e} in card choice...")
+            choice = []
 
-        card_paths = []
-        for user_card in choice:
-            card_path = os.path.join(self.config.cards_dir, f"{roles}_{user_card}.json")
-            card_paths.append(card_path)
-        
-        if not card_paths:
+        # unparsable, empty or invented choices fall back to both cards
+        choice = [user for user in choice if user in speakers] if isinstance(choice, list) else []
+        if not choice:
             choice = speakers
-            for speaker in speakers:
-                card_path = os.path.join(self.config.cards_dir, f"{roles}_{speaker}.json")
-                card_paths.append(card_path)
-                
-        return card_paths, choice
-    
-    def form_search_prompt(self, 
+
+        return self._card_paths(speakers, choice), choice
+
+    def _route_card(self,
+                    question: str,
+                    speakers: List[str],
+                    query_embedding=None):
+        # local choice from the router, None when the LLM has to decide
+        if self.card_router is None:
+            return None
+        mentioned = self.card_router.match_names(question, speakers)
+        if mentioned:
+            return self._card_paths(speakers, mentioned), mentioned
+        if callable(query_embedding):
+            query_embedding = query_embedding()
+        choice = self.card_router.route(question, speakers, self._card_paths(speakers, speakers),
+                                        query_embedding=query_embedding)
+        return (self._card_paths(speakers, choice), choice) if choice else None
+
+    async def _aroute_card(self,
+                           question: str,
+                           speakers: List[str],
+                           query_embedding=None):
+        if self.card_router is None:
+            return None
+        mentioned = self.card_router.match_names(question, speakers)
+        if mentioned:
+            return self._card_paths(speakers, mentioned), mentioned
+        if inspect.isawaitable(query_embedding):
+            query_embedding = await query_embedding
+        choice = await asyncio.to_thread(self.card_router.route,
+                                         question, speakers, self._card_paths(speakers, speakers),
+                                         query_embedding)
+        return (self._card_paths(speakers, choice), choice) if choice else None
+
+    @traced("choose_card.llm")
+    def _llm_choose_card(self,
+                         question: str,
+                         speakers: List[str]):
+        card_choice = self.llm_client.client_response(
+            system_prompt=USER_PROMPT,
+            input_prompt=self._card_choice_prompt(question, speakers),
+            stage="user-choice")
+
+        return self._parse_card_choice(card_choice, speakers)
+
+    @traced("choose_card.llm")
+    async def _allm_choose_card(self,
+                                question: str,
+                                speakers: List[str]):
+        card_choice = await self.llm_client.aclient_response(
+            system_prompt=USER_PROMPT,
+            input_prompt=self._card_choice_prompt(question, speakers),
+            stage="user-choice")
+
+        return self._parse_card_choice(card_choice, speakers)
+
+    @traced()
+    def choose_card(self,
+                    question: str,
+                    speakers: List[str],
+                    query_embedding=None):
+        """
+        query_embedding is a vector or a zero-arg callable producing one (e.g. a
+        future's result); it is only resolved when the router needs centroids.
+        """
+        return (self._route_card(question, speakers, query_embedding)
+                or self._llm_choose_card(question, speakers))
+
+    @traced()
+    async def achoose_card(self,
+                           question: str,
+                           speakers: List[str],
+                           query_embedding=None):
+        # query_embedding is a vector or an awaitable (e.g. the embedding task)
+        return (await self._aroute_card(question, speakers, query_embedding)
+                or await self._allm_choose_card(question, speakers))
+
+    @traced()
+    def form_search_prompt(self,
                            card_paths: List[str],
                            users: List[str]):
-        
+
         print("users=",users)
         print("card_paths=",card_paths)
         contents_prompt = " "
         for idx, card_path in enumerate(card_paths):
-            with open(card_path, 'r', encoding='utf-8') as f:
-                content = f.read()  
-                card_content = json.loads(content)  
-
+            card_content = self.card_cache.prompt_text(card_path)
             contents_prompt = contents_prompt + f"user name:{users[idx]}\n{card_content}"
         return contents_prompt
 
-    def answer(self,
-               question: str,
-               speakers: List[str]):
-        
-        roles = f"{speakers[0]}_{speakers[1]}"
-        
-        card_paths, users = self.choose_card(question=question, 
-                                      speakers=speakers)
-        
-        contents_prompt = self.form_search_prompt(card_paths=card_paths, users=users)
-        
-        search_prompt = f"question:{question}\nContents:{contents_prompt}"
-        search_results = self.llm_client.client_response(
-            system_prompt=SEARCH_PROMPT,
-            input_prompt=search_prompt)
-        
+    def invalidate_card(self, card_path: Optional[str] = None) -> None:
+        # called when a card is rebuilt, None drops every cached card
+        self.card_cache.invalidate(card_path)
+        if self.card_router is not None:
+            self.card_router.invalidate(card_path)
+
+    def _parse_search_threads(self, search_results: str):
         try:
             search_results = json.loads(search_results)
         except json.JSONDecodeError as e:
             print(f"Error {e} in search...")
-        
-        search_threads = search_results["results"]
- 
-        episode_results = self.backend.search_episodes(user_id=roles,
-                                                        query=question,
-                                                        top_k=20)  
-
-        episode_contents = [search_result['content'] for search_result in episode_results]   
+
+        return search_results["results"]
+
+    def _episode_answer_prompt(self,
+                               question: str,
+                               episode_results: List):
+        episode_contents = [search_result['content'] for search_result in episode_results]
         episode_prompt = "\n".join(episode_contents)
 
-        answer_prompt = f"Question: {question}\n\nContents:\nEpisodes:\n{episode_prompt}\n\n"
-        
-        for idx, search_thread in enumerate(search_threads):
-        
+        return f"Question: {question}\n\nContents:\nEpisodes:\n{episode_prompt}\n\n"
+
+    @staticmethod
+    def _thread_requests(search_threads: List):
+        # (user, unique thread ids) for every user that got threads back
+        requests = []
+        for search_thread in search_threads:
             user = list(search_thread.keys())[0]
             search_thread = search_thread[user]
             if search_thread:
                 thread_ids = list(set(item["thread_id"] for item in search_thread))
-                
-                thread_collection = self.backend._get_thread_collection(user_id=f"{roles}_{user}")
-                threads = thread_collection.get(ids=thread_ids, include=['documents', 'metadatas'])
-                threads = threads['documents']
-                threads = "\n".join(threads)  
-                answer_prompt = answer_prompt + f"{user} threads:\n" + threads
+                requests.append((user, thread_ids))
+        return requests
+
+    def _fetch_threads(self, roles: str, request) -> str:
+        user, thread_ids = request
+        threads = self.backend.get_threads(user_id=f"{roles}_{user}", thread_ids=thread_ids)
+        threads = "\n".join(threads['documents'])
+        return f"{user} threads:\n" + threads
+
+    def _run_search(self,
+                    question: str,
+                    card_paths: List[str],
+                    users: List[str]):
+        # SEARCH_PROMPT call over the given cards, returns the (user, thread ids) to fetch
+        contents_prompt = self.form_search_prompt(card_paths=card_paths, users=users)
+        search_prompt = f"question:{question}\nContents:{contents_prompt}"
+        search_results = self.llm_client.client_response(
+            system_prompt=SEARCH_PROMPT,
+            input_prompt=search_prompt,
+            stage="search")
+
+        try:
+            return self._thread_requests(self._parse_search_threads(search_results))
+        except (KeyError, TypeError, AttributeError, IndexError):
+            self.llm_client.forget_response(SEARCH_PROMPT, search_prompt)
+            raise
+
+    async def _arun_search(self,
+                           question: str,
+                           card_paths: List[str],
+                           users: List[str]):
+        contents_prompt = await asyncio.to_thread(self.form_search_prompt, card_paths, users)
+        search_prompt = f"question:{question}\nContents:{contents_prompt}"
+        search_results = await self.llm_client.aclient_response(
+            system_prompt=SEARCH_PROMPT,
+            input_prompt=search_prompt,
+            stage="search")
+
+        try:
+            return self._thread_requests(self._parse_search_threads(search_results))
+        except (KeyError, TypeError, AttributeError, IndexError):
+            await self.llm_client.aforget_response(SEARCH_PROMPT, search_prompt)
+            raise
+
+    def _search_threads(self,
+                        question: str,
+                        speakers: List[str],
+                        query_embedding=None,
+                        timer: Optional[StageTimer] = None):
+        """
+        Card choice + SEARCH_PROMPT call, returns the (user, thread ids) to fetch.
+
+        When the router cannot decide, SEARCH over both cards (the fallback
+        choice) runs while the LLM picks the cards. Its result is kept when the
+        LLM picks both speakers, so that case costs one round trip instead of
+        two; otherwise SEARCH runs again on the LLM's choice.
+        """
+        timer = timer or StageTimer()
+        routed = self._route_card(question, speakers, query_embedding)
+        if routed is None and self.config.speculative_search:
+            speculative = self.executor.submit(contextvars.copy_context().run, self._run_search,
+                                               question, self._card_paths(speakers, speakers), list(speakers))
+            card_paths, users = self._llm_choose_card(question, speakers)
+            timer.mark("choose_card")
+            if set(users) == set(speakers):
+                requests = speculative.result()
+            else:
+                requests = self._run_search(question, card_paths, users)
+        else:
+            card_paths, users = routed or self._llm_choose_card(question, speakers)
+            timer.mark("choose_card")
+            requests = self._run_search(question, card_paths, users)
+        timer.mark("search")
+        return requests
+
+    async def _asearch_threads(self,
+                               question: str,
+                               speakers: List[str],
+                               query_embedding=None,
+                               timer: Optional[StageTimer] = None):
+        timer = timer or StageTimer()
+        routed = await self._aroute_card(question, speakers, query_embedding)
+        if routed is None and self.config.speculative_search:
+            speculative = asyncio.create_task(self._arun_search(question,
+                                                                self._card_paths(speakers, speakers),
+                                                                list(speakers)))
+            try:
+                card_paths, users = await self._allm_choose_card(question, speakers)
+                timer.mark("choose_card")
+                if set(users) == set(speakers):
+                    requests = await speculative
+                else:
+                    speculative.cancel()
+                    requests = await self._arun_search(question, card_paths, users)
+            except BaseException:
+                speculative.cancel()
+                raise
+        else:
+            card_paths, users = routed or await self._allm_choose_card(question, speakers)
+            timer.mark("choose_card")
+            requests = await self._arun_search(question, card_paths, users)
+        timer.mark("search")
+        return requests
+
+    def _prepare_answer(self,
+                        question: str,
+                        speakers: List[str],
+                        timer: StageTimer) -> str:
+        # everything before the final answer call. Episode retrieval only needs the
+        # question, so it runs while the card choice and search LLM calls are in flight;
+        # the per-user thread fetches then run side by side.
+
+        roles = f"{speakers[0]}_{speakers[1]}"
+        # one background embedding serves the episode search and, only if the name
+        # match is not enough, the router's centroid fallback
+        embedding_future = self.executor.submit(contextvars.copy_context().run,
+                                                self.backend.embedding_client.embed_text, question)
+        # submitted after the embedding, so it never waits on a task still queued behind it
+        episode_future = self.executor.submit(contextvars.copy_context().run,
+                                              lambda: self.backend.search_episodes(
+                                                  user_id=roles, query=question, top_k=20,
+                                                  query_embedding=embedding_future.result()))
+
+        requests = self._search_threads(question, speakers, query_embedding=embedding_future.result, timer=timer)
+        user_threads = ordered_map(lambda request: self._fetch_threads(roles, request),
+                                   requests,
+                                   max_workers=len(requests))
+
+        answer_prompt = self._episode_answer_prompt(question, episode_future.result())
+        answer_prompt = answer_prompt + "".join(user_threads)
+        timer.mark("retrieve")
+
+        return answer_prompt
+
+    async def _aprepare_answer(self,
+                               question: str,
+                               speakers: List[str],
+                               timer: StageTimer) -> str:
+
+        roles = f"{speakers[0]}_{speakers[1]}"
+        embedding_task = asyncio.create_task(self.backend.embedding_client.aembed_text(question))
+
+        async def search_episodes():
+            return await self.async_backend.search_episodes(user_id=roles,
+                                                            query=question,
+                                                            top_k=20,
+                                                            query_embedding=await embedding_task)
+
+        episode_task = asyncio.create_task(search_episodes())
+
+        try:
+            requests = await self._asearch_threads(question, speakers,
+                                                   query_embedding=embedding_task, timer=timer)
+            user_threads = await asyncio.gather(*(
+                self.async_backend.get_threads(user_id=f"{roles}_{user}", thread_ids=thread_ids)
+                for user, thread_ids in requests))
+
+            answer_prompt = self._episode_answer_prompt(question, await episode_task)
+            for (user, _), threads in zip(requests, user_threads):
+                answer_prompt = answer_prompt + f"{user} threads:\n" + "\n".join(threads['documents'])
+        except BaseException:
+            # don't leave the background search running (or its error unretrieved)
+            episode_task.cancel()
+            embedding_task.cancel()
+            raise
+        timer.mark("retrieve")
+
+        return answer_prompt
+
+    @traced()
+    def answer(self,
+               question: str,
+               speakers: List[str]):
+
+        answer_prompt = self._prepare_answer(question, speakers, StageTimer())
 
         response = self.llm_client.client_response(
             system_prompt=ANSWER_PROMPT,
-            input_prompt=answer_prompt)
+            input_prompt=answer_prompt,
+            stage="answer")
+
+        return response
+
+    @traced()
+    async def aanswer(self,
+                      question: str,
+                      speakers: List[str]):
+
+        answer_prompt = await self._aprepare_answer(question, speakers, StageTimer())
+
+        response = await self.llm_client.aclient_response(
+            system_prompt=ANSWER_PROMPT,
+            input_prompt=answer_prompt,
+            stage="answer")
 
         return response
+
+    @traced()
+    def answer_batch(self,
+                     questions: List[str],
+                     speakers: List[str],
+                     max_workers: Optional[int] = None) -> List[Optional[str]]:
+        """
+        Answer many questions about one conversation, results in input order.
+
+        All questions are embedded in one call and episodes come from one
+        Chroma query with every query vector. The card choice / search calls
+        and the final answer calls run on a pool of `max_workers`, and the
+        threads all questions asked for are fetched with one get per user.
+        A question that fails gets None in its slot; the others still answer.
+        """
+        if not questions:
+            return []
+        roles = f"{speakers[0]}_{speakers[1]}"
+        max_workers = max_workers or self.config.answer_batch_workers
+
+        query_embeddings = self.backend.embedding_client.embed_texts(questions).embeddings
+        episode_results = self.backend.search_batch(user_id=roles,
+                                                    kind="episode",
+                                                    query_embeddings=query_embeddings,
+                                                    top_k=20)
+
+        thread_requests = _map_keep_going(
+            lambda idx: self._search_threads(questions[idx], speakers, query_embeddings[idx]),
+            range(len(questions)),
+            max_workers=max_workers,
+            stage="search")
+
+        wanted = {}
+        for requests in thread_requests:
+            for user, thread_ids in requests or []:
+                wanted.setdefault(user, set()).update(thread_ids)
+        users = list(wanted)
+        fetched = _map_keep_going(lambda user: self.backend.get_threads(user_id=f"{roles}_{user}",
+                                                                        thread_ids=list(wanted[user])),
+                                  users,
+                                  max_workers=len(users),
+                                  stage="thread fetch")
+        documents = {user: dict(zip(threads['ids'], threads['documents'])) if threads else {}
+                     for user, threads in zip(users, fetched)}
+
+        answer_prompts = []
+        for question, episodes, requests in zip(questions, episode_results, thread_requests):
+            if requests is None:
+                answer_prompts.append(None)
+                continue
+            answer_prompt = self._episode_answer_prompt(question, episodes)
+            for user, thread_ids in requests:
+                threads = "\n".join(documents[user][thread_id] for thread_id in thread_ids
+                                    if thread_id in documents[user])
+                answer_prompt = answer_prompt + f"{user} threads:\n" + threads
+            answer_prompts.append(answer_prompt)
+
+        return _map_keep_going(lambda answer_prompt: None if answer_prompt is None else
+                               self.llm_client.client_response(system_prompt=ANSWER_PROMPT,
+                                                               input_prompt=answer_prompt,
+                                                               stage="answer"),
+                               answer_prompts,
+                               max_workers=max_workers,
+                               stage="answer")
+
+    def answer_stream(self,
+                      question: str,
+                      speakers: List[str],
+                      on_stage: Optional[Callable[[str, float], None]] = None) -> Iterator[str]:
+        """
+        Yield the final answer token by token. on_stage(stage, seconds) is
+        called after choose_card, search, retrieve, first_token and answer.
+        """
+        timer = StageTimer(on_stage)
+        answer_prompt = self._prepare_answer(question, speakers, timer)
+
+        first = True
+        for token in self.llm_client.client_stream(system_prompt=ANSWER_PROMPT,
+                                                   input_prompt=answer_prompt,
+                                                   stage="answer"):
+            if first:
+                timer.mark("first_token")
+                first = False
+            yield token
+        timer.mark("answer")
+
+    async def aanswer_stream(self,
+                             question: str,
+                             speakers: List[str],
+                             on_stage: Optional[Callable[[str, float], None]] = None) -> AsyncIterator[str]:
+        timer = StageTimer(on_stage)
+        answer_prompt = await self._aprepare_answer(question, speakers, timer)
+
+        first = True
+        async for token in self.llm_client.aclient_stream(system_prompt=ANSWER_PROMPT,
+                                                          input_prompt=answer_prompt,
+                                                          stage="answer"):
+            if first:
+                timer.mark("first_token")
+                first = False
+            yield token
+        timer.mark("answer")
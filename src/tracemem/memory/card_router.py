@@ -0,0 +1,122 @@
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from ..configs.embedding import Embedding
+from ..cache.card_cache import CardCache
+import numpy as np
+import json
+import os
+import re
+import threading
+
+import logging
+logger = logging.getLogger(__name__)
+
+# questions about the pair rather than one speaker
+_BOTH_CUES = re.compile(r"\b(they|them|their|both|each other|together|one another)\b", re.IGNORECASE)
+
+
+def _card_texts(node) -> List[str]:
+    # every non-empty string leaf of a card
+    if isinstance(node, str):
+        return [node] if node.strip() else []
+    if isinstance(node, dict):
+        node = list(node.values())
+    if isinstance(node, list):
+        return [text for child in node for text in _card_texts(child)]
+    return []
+
+
+class CardRouter:
+    """
+    Local replacement for the choose_card LLM call.
+
+    Speakers named in the question (or plural cues such as "they") decide
+    the cards directly. Otherwise the question embedding is compared with a
+    unit-norm centroid of each speaker's card, and a speaker wins only when
+    it beats the other by `margin`. route() returns None when it is not
+    confident, so the caller can fall back to the LLM. At most `max_entries`
+    centroids are kept, least recently used first out.
+    """
+
+    def __init__(self, embedding_client: Embedding, margin: float = 0.03,
+                 card_cache: Optional[CardCache] = None,
+                 max_entries: int = 1024):
+        self.embedding_client = embedding_client
+        self.margin = margin
+        self.card_cache = card_cache
+        self.max_entries = max_entries
+        self._centroids: "OrderedDict[str, Tuple[float, int, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def match_names(question: str, speakers: List[str]) -> List[str]:
+        mentioned = []
+        for speaker in speakers:
+            names = {speaker, speaker.split()[0]} if speaker.strip() else set()
+            if any(re.search(rf"\b{re.escape(name)}\b", question, re.IGNORECASE) for name in names):
+                mentioned.append(speaker)
+        if not mentioned and _BOTH_CUES.search(question):
+            return list(speakers)
+        return mentioned
+
+    def centroid(self, card_path: str) -> Optional[np.ndarray]:
+        """Unit-norm mean embedding of a card, recomputed when the file changes"""
+        try:
+            stat = os.stat(card_path)
+        except OSError:
+            return None
+        with self._lock:
+            cached = self._centroids.get(card_path)
+            if cached is not None and cached[:2] == (stat.st_mtime, stat.st_size):
+                self._centroids.move_to_end(card_path)
+                return cached[2]
+
+        if self.card_cache is not None:
+            card = self.card_cache.get(card_path)
+        else:
+            with open(card_path, 'r', encoding='utf-8') as f:
+                card = json.load(f)
+        texts = _card_texts(card)
+        if not texts:
+            return None
+        embeddings = np.asarray(self.embedding_client.embed_texts(texts).embeddings, dtype=np.float32)
+        vector = embeddings.mean(axis=0)
+        vector /= np.linalg.norm(vector) or 1.0
+
+        with self._lock:
+            self._centroids[card_path] = (stat.st_mtime, stat.st_size, vector)
+            self._centroids.move_to_end(card_path)
+            while len(self._centroids) > self.max_entries:
+                self._centroids.popitem(last=False)
+        return vector
+
+    def invalidate(self, card_path: Optional[str] = None) -> None:
+        with self._lock:
+            if card_path is None:
+                self._centroids.clear()
+            else:
+                self._centroids.pop(card_path, None)
+
+    def route(self,
+              question: str,
+              speakers: List[str],
+              card_paths: List[str],
+              query_embedding: Optional[List[float]] = None) -> Optional[List[str]]:
+        """Speakers whose cards to search, or None when the router is not confident"""
+        mentioned = self.match_names(question, speakers)
+        if mentioned:
+            return mentioned
+
+        centroids = [self.centroid(card_path) for card_path in card_paths]
+        if len(speakers) < 2 or any(centroid is None for centroid in centroids):
+            return None
+
+        if query_embedding is None:
+            query_embedding = self.embedding_client.embed_text(question)
+        query = np.array(query_embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        scores = np.stack(centroids) @ query
+        order = np.argsort(scores)[::-1]
+        if scores[order[0]] - scores[order[1]] < self.margin:
+            return None
+        return [speakers[order[0]]]
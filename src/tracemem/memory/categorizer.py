@@ -10,6 +10,10 @@ from ..configs.chroma import ChromaEngine
 from ..configs.client import Client
 from ..storage.thread import ThreadMemory
 from .prompts import TOPIC_PROMPT, THREAD_PROMPT, THEME_PROMPT
+from ..utils.tracing import traced
+
+import logging
+logger = logging.getLogger(__name__)
 
 class Categorizer:
     def __init__(self, backend: ChromaEngine, config: MemoryConfig, llm_client: Client):
@@ -19,9 +23,27 @@ class Categorizer:
         self.min_samples = 1
         self.thread_map = {}
     
-    def _fetch_data(self, user_id: str):
+    def _load_experiences(self, user_id: str) -> Dict:
         collection = self.backend._get_experience_collection(user_id=user_id)
-        results = collection.get(include=['embeddings', 'documents', 'metadatas'])
+        store = self.backend.vector_store
+        collection_name = self.backend._get_experience_collection_name(user_id)
+        if store is None or not store.has(collection_name):
+            return collection.get(include=['embeddings', 'documents', 'metadatas'])
+
+        # vectors come from the memory-mapped store (no copy), text and metadata from Chroma
+        results = collection.get(include=['documents', 'metadatas'])
+        ids, embeddings = store.load(collection_name)
+        records = dict(zip(results['ids'], zip(results['documents'], results['metadatas'])))
+        if set(ids) != set(records):
+            logger.warning(f"Vector store out of sync with {collection_name}, reading embeddings from Chroma")
+            return collection.get(include=['embeddings', 'documents', 'metadatas'])
+        return {"ids": ids,
+                "documents": [records[record_id][0] for record_id in ids],
+                "metadatas": [records[record_id][1] for record_id in ids],
+                "embeddings": embeddings}
+
+    def _fetch_data(self, user_id: str):
+        results = self._load_experiences(user_id)
         
         if results['embeddings'] is None or len(results['embeddings']) == 0:
             raise ValueError(f"Collection '{user_id}' has no data.")
@@ -31,7 +53,7 @@ class Categorizer:
         print(f"Vector dimension: {len(results['embeddings'][0])}")
         
         # Calculate and display vector norm statistics
-        embeddings = np.array(results['embeddings'])
+        embeddings = np.asarray(results['embeddings'])
         norms = np.linalg.norm(embeddings, axis=1)
         print(f"Vector norm statistics - Mean: {np.mean(norms):.3f}, Std: {np.std(norms):.3f}")
         print(f"Vector norm range: [{np.min(norms):.3f}, {np.max(norms):.3f}]")
@@ -43,13 +65,14 @@ class Categorizer:
             "documents": results['documents'],
             "ids": results['ids']}
     
+    @traced()
     def run_clustering(self, 
                        data: Dict, 
                        n_neighbors: int,
                        min_cluster_size: int,
                        use_pca=True):
 
-        embeddings = np.array(data["embeddings"])
+        embeddings = np.asarray(data["embeddings"])
         
         if use_pca:
             n_components = min(50, len(embeddings) - 1, embeddings.shape[1])
@@ -126,6 +149,7 @@ class Categorizer:
 
 
     
+    @traced()
     def topic_categorize(self,
                          roles: str, 
                          user_id: str):
@@ -141,28 +165,33 @@ class Categorizer:
             
             topics_result = self.llm_client.client_response(
                 system_prompt=TOPIC_PROMPT,
-                input_prompt=input_prompt)  
+                input_prompt=input_prompt,
+                stage="topic")  
             
             try:
                 topic = json.loads(topics_result)
             except json.JSONDecodeError as e:
                 print(f"Error {e} in topic generation...")
+                self.llm_client.forget_response(TOPIC_PROMPT, input_prompt)
 
             topics['topics'].append(topic)
         
         topics_input = json.dumps(topics, ensure_ascii=False, indent=2)
         themes = self.llm_client.client_response(
             system_prompt=THEME_PROMPT,
-            input_prompt=topics_input) 
+            input_prompt=topics_input,
+            stage="theme") 
         
         try:
             themes = json.loads(themes)   
         except json.JSONDecodeError as e:
             print(f"Error {e} in topic summary generation...")
+            self.llm_client.forget_response(THEME_PROMPT, topics_input)
                       
         themes.update(topics)
         return topic_clusters, themes
     
+    @traced()
     def thread_categorize(self, 
                           topic_clusters: Dict[str, Dict], 
                           topics: Dict):
@@ -172,36 +201,45 @@ class Categorizer:
                                                   n_neighbors=2,
                                                   min_cluster_size=2)
             
+            # write all thread memories of this topic in one bulk call
+            thread_memories = [self.create_thread_memory(thread_cluster) 
+                               for thread_cluster in thread_clusters.values()]
+            self.backend.add_thread_memories(thread_memories)
+
             threads = []   
-            for _, thread_cluster in thread_clusters.items():       
+            for thread_cluster, thread_memory in zip(thread_clusters.values(), thread_memories):       
                 # summarize experiences and formulate the one thread
-                thread = self.experience_summarize(cluster=thread_cluster) # exper_summaries: List
+                thread = self.experience_summarize(cluster=thread_cluster,
+                                                   thread_id=thread_memory.thread_id) # exper_summaries: List
                 threads.append(thread)
             topics["topics"][topic_idx]['threads'] = threads
 
         return topics
     
-    def experience_summarize(self, cluster: Dict[str, Dict]) -> List:
+    def experience_summarize(self, cluster: Dict[str, Dict], thread_id: str = None) -> List:
 
-        thread_id = self.add_thread_memory(cluster)
+        if thread_id is None:
+            thread_id = self.add_thread_memory(cluster)
 
         exper_contents = cluster["documents"]
 
         contents_prompt = "\n".join(exper_contents)
         thread_summary = self.llm_client.client_response(
             system_prompt=THREAD_PROMPT,
-            input_prompt=contents_prompt) 
+            input_prompt=contents_prompt,
+            stage="thread") 
         
         try:
             thread_summary = json.loads(thread_summary)
         except json.JSONDecodeError as e:
             print(f"Error {e} in thread summary generation...")
+            self.llm_client.forget_response(THREAD_PROMPT, contents_prompt)
         
         thread_summary.update({"thread_id":thread_id})
         return thread_summary
                      
 
-    def add_thread_memory(self, cluster: Dict[str, Dict]):
+    def create_thread_memory(self, cluster: Dict[str, Dict]) -> ThreadMemory:
         
         documents = cluster["documents"]
         episode_ids = [metadata["source_episode"] for metadata in cluster["metadatas"]]
@@ -213,6 +251,11 @@ class Categorizer:
             content=thread_content,
             source_episode=json.dumps(episode_ids),
             user_id=user_id)
+        if self.config.deterministic_ids:
+            thread_memory.assign_content_id()
+        return thread_memory
 
-        self.backend.add_thread_memory(user_id=user_id, thread=thread_memory)
+    def add_thread_memory(self, cluster: Dict[str, Dict]):
+        thread_memory = self.create_thread_memory(cluster)
+        self.backend.add_thread_memory(user_id=thread_memory.user_id, thread=thread_memory)
         return thread_memory.thread_id
@@ -0,0 +1,92 @@
+from .prompts import EPISODE_EXPERIENCE_PROMPT
+from .summarizer import Summarizer
+from .persona_extractor import PersonaExtractor
+from ..configs.client import Client
+from ..utils.parallel import ordered_map
+from ..utils.tracing import traced
+from typing import Dict, List, Optional
+import json
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class FusedExtractor:
+    """Summary and per-speaker experiences of a topic from a single LLM call"""
+
+    def __init__(self,
+                 llm_client: Client,
+                 summarizer: Summarizer,
+                 extractor: PersonaExtractor,
+                 max_workers: int = 1):
+        self.llm_client = llm_client
+        self.summarizer = summarizer
+        self.extractor = extractor
+        self.max_workers = max_workers
+
+    def format_fused_prompt(self, topic: Dict, messages: List[Dict]) -> str:
+        sidx, eidx = topic['range'][0], topic['range'][1]
+        dialogue = self.summarizer.format_episode_prompt(messages[sidx:eidx+1])
+        speakers = list(topic['semantic_memories'].keys())
+
+        labeled_memories = []
+        for speaker in speakers:
+            for memory_text in topic['semantic_memories'][speaker]:
+                labeled_memories.append(f" - {speaker}: {memory_text}")
+
+        return (f"{dialogue}\n"
+                f"Speakers: {', '.join(speakers)}\n"
+                f"Labeled Semantic Memories:\n" + "\n".join(labeled_memories))
+
+    @staticmethod
+    def parse_fused_response(response: str, speakers: List[str]) -> Optional[Dict]:
+        """Validate against the shapes _process_single_topic consumes, None if unusable"""
+        try:
+            result = json.loads(response)
+        except (json.JSONDecodeError, TypeError):
+            return None
+
+        summary = result.get('summary') if isinstance(result, dict) else None
+        experiences = result.get('experiences') if isinstance(result, dict) else None
+        if not isinstance(summary, str) or not summary.strip() or not isinstance(experiences, dict):
+            return None
+
+        parsed = {}
+        for speaker in speakers:
+            experience = experiences.get(speaker)
+            if isinstance(experience, str):
+                experience = {"Experience": experience}
+            if not isinstance(experience, dict) or not isinstance(experience.get('Experience'), str):
+                return None
+            parsed[speaker] = experience
+        return {"summary": summary, "experience": parsed}
+
+    @traced()
+    def topic_summary_experiences(self, topic: Dict, messages: List[Dict]) -> Dict:
+        speakers = list(topic['semantic_memories'].keys())
+        input_prompt = self.format_fused_prompt(topic, messages)
+        response = self.llm_client.client_response(system_prompt=EPISODE_EXPERIENCE_PROMPT,
+                                                   input_prompt=input_prompt,
+                                                   stage="episode-persona")
+        parsed = self.parse_fused_response(response, speakers)
+        if parsed is not None:
+            return parsed
+        self.llm_client.forget_response(EPISODE_EXPERIENCE_PROMPT, input_prompt)
+
+        # malformed fused output: fall back to the staged calls for this topic only
+        logger.warning(f"Fused extraction returned an invalid shape for topic {topic['range']}, falling back")
+        summary = self.summarizer.episode_summary(topic, messages)
+        fallback = {"summary": summary, "semantic_memories": topic['semantic_memories']}
+        return {"summary": summary,
+                "experience": {speaker: self.extractor.experience_extraction(fallback, speaker)
+                               for speaker in speakers}}
+
+    @traced()
+    def episodes_experiences(self, topics: List[Dict], messages: List[Dict]) -> List[Dict]:
+        results = ordered_map(lambda topic: self.topic_summary_experiences(topic, messages),
+                              topics,
+                              max_workers=self.max_workers)
+        for topic, result in zip(topics, results):
+            topic['summary'] = result['summary']
+            topic['experience'] = result['experience']
+        return topics
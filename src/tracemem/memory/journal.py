@@ -0,0 +1,100 @@
+from typing import Dict, List, Optional, Set, Tuple
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class IngestionJournal:
+    """
+    Checkpoint journal for resumable ingestion.
+
+    A session is identified by (roles, session_key, content hash). For every
+    finished stage the topic dicts it produced are stored, written topics are
+    marked one by one during commit, and a fully written session is marked
+    committed so reruns skip it.
+    """
+
+    STAGES = ("segment", "summary", "extract")
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS stages ("
+            "roles TEXT, session_key TEXT, content_hash TEXT, stage TEXT, topics TEXT, updated_at REAL, "
+            "PRIMARY KEY (roles, session_key, content_hash, stage))")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS written_topics ("
+            "roles TEXT, session_key TEXT, content_hash TEXT, topic_index INTEGER, "
+            "PRIMARY KEY (roles, session_key, content_hash, topic_index))")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "roles TEXT, session_key TEXT, content_hash TEXT, committed_at REAL, "
+            "PRIMARY KEY (roles, session_key, content_hash))")
+
+    @staticmethod
+    def session_hash(messages: List[Dict]) -> str:
+        payload = json.dumps(messages, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def is_committed(self, roles: str, session_key: str, content_hash: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM sessions WHERE roles = ? AND session_key = ? AND content_hash = ?",
+                (roles, session_key, content_hash)).fetchone()
+        return row is not None
+
+    def mark_committed(self, roles: str, session_key: str, content_hash: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?)",
+                (roles, session_key, content_hash, time.time()))
+
+    def last_stage(self, roles: str, session_key: str, content_hash: str) -> Tuple[Optional[str], Optional[List[Dict]]]:
+        """Latest finished stage of a session and the topics it produced"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT stage, topics FROM stages WHERE roles = ? AND session_key = ? AND content_hash = ?",
+                (roles, session_key, content_hash)).fetchall()
+        done = {stage: topics for stage, topics in rows}
+        for stage in reversed(self.STAGES):
+            if stage in done:
+                return stage, json.loads(done[stage])
+        return None, None
+
+    def record_stage(self, roles: str, session_key: str, content_hash: str, stage: str, topics: List[Dict]) -> None:
+        payload = json.dumps(topics, ensure_ascii=False, default=str)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO stages VALUES (?, ?, ?, ?, ?, ?)",
+                (roles, session_key, content_hash, stage, payload, time.time()))
+
+    def written_topics(self, roles: str, session_key: str, content_hash: str) -> Set[int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT topic_index FROM written_topics WHERE roles = ? AND session_key = ? AND content_hash = ?",
+                (roles, session_key, content_hash)).fetchall()
+        return {row[0] for row in rows}
+
+    def record_topic(self, roles: str, session_key: str, content_hash: str, topic_index: int) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO written_topics VALUES (?, ?, ?, ?)",
+                (roles, session_key, content_hash, topic_index))
+
+    def reset(self, roles: Optional[str] = None) -> None:
+        with self._lock:
+            for table in ("stages", "written_topics", "sessions"):
+                if roles is None:
+                    self._conn.execute(f"DELETE FROM {table}")
+                else:
+                    self._conn.execute(f"DELETE FROM {table} WHERE roles = ?", (roles,))
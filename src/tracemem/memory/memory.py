@@ -1,6 +1,9 @@
 from ..configs.client import Client
 from ..configs.embedding import Embedding
 from ..configs.config import MemoryConfig
+from ..configs.rate_limiter import RateLimiter
+from ..configs.concurrency import AdaptiveConcurrencyLimiter
+from ..configs.usage import UsageTracker
 from ..storage.episode import Episode
 from ..storage.semantic import SemanticMemory
 from ..storage.experience import ExperienceMemory
@@ -8,10 +11,18 @@ from .segmenter import TopicSegmentor
 from .categorizer import Categorizer
 from .persona_extractor import PersonaExtractor
 from .summarizer import Summarizer
+from .fused_extractor import FusedExtractor
+from .session_extractor import SessionExtractor
 # from configs.bm25 import BM25Search
 # from cache.redis_manager import MemoryRedisManager
 from .agentic_search import AgentReason
-from typing import Dict, List
+from .pipeline import SessionJob, SessionPipeline
+from .journal import IngestionJournal
+from ..utils.parallel import ordered_map, aordered_map
+from ..utils.tracing import traced, enable_tracing
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+from collections import deque
+import asyncio
 import threading
 import json
 import os
@@ -24,6 +35,11 @@ class TraceMem:
     _GLOBAL_DB_LOCK = threading.Lock()
     _SHARED_CHROMA_INDEX = None
     _SHARED_BACKEND = None
+    _SHARED_LLM_CACHE = None
+    _SHARED_EMBEDDING_CACHE = None
+    _SHARED_JOURNAL = None
+    _SHARED_CARD_CACHE = None
+    _SHARED_CONCURRENCY = {}
 
 
     def __init__(self):
@@ -32,18 +48,39 @@ class TraceMem:
         self._chroma_index = None
         self._db_lock = threading.RLock()
         self.config = MemoryConfig()  
+        self.usage = UsageTracker()
+        if self.config.tracing_enabled:
+            enable_tracing(self.config.trace_path, self.config.trace_format)
         self.llm_client = Client(api_key=self.config.openai_api_key, 
                                  base_url= self.config.base_url,
-                                 model=self.config.llm_model)
+                                 model=self.config.llm_model,
+                                 cache=self.llm_cache,
+                                 rate_limiter=self.rate_limiter,
+                                 concurrency=self._concurrency_gate("llm", self.config.llm_latency_target),
+                                 usage=self.usage,
+                                 stream_usage=self.config.llm_stream_usage)
         self.embedding_client = Embedding(api_key=self.config.openai_api_key,
                                           base_url= self.config.base_url,
-                                          model=self.config.embedding_model)
+                                          model=self.config.embedding_model,
+                                          cache=self.embedding_cache,
+                                          rate_limiter=self.rate_limiter,
+                                          concurrency=self._concurrency_gate("embedding", self.config.embedding_latency_target),
+                                          usage=self.usage,
+                                          dimensions=self.config.embedding_dimension)
         self.topic_segmentor = TopicSegmentor(llm_client=self.llm_client)
+        self.session_extractor = SessionExtractor(llm_client=self.llm_client, segmentor=self.topic_segmentor)
         self.clusterer = Categorizer(backend=self.backend, config=self.config, llm_client=self.llm_client)
-        self.extrator = PersonaExtractor(llm_client=self.llm_client)
-        self.summarizer = Summarizer(llm_client=self.llm_client)
+        self.extrator = PersonaExtractor(llm_client=self.llm_client,
+                                         max_workers=self.config.semantic_generation_workers)
+        self.summarizer = Summarizer(llm_client=self.llm_client,
+                                     max_workers=self.config.semantic_generation_workers)
+        self.fused_extractor = FusedExtractor(llm_client=self.llm_client,
+                                              summarizer=self.summarizer,
+                                              extractor=self.extrator,
+                                              max_workers=self.config.semantic_generation_workers)
         # self.redis_manager = MemoryRedisManager()
-        self.reason_agent = AgentReason(llm_client=self.llm_client,config=self.config,backend=self.backend)
+        self.reason_agent = AgentReason(llm_client=self.llm_client,config=self.config,backend=self.backend,
+                                        card_cache=self.card_cache)
     
     # @property
     # def search_engine(self):   
@@ -67,6 +104,87 @@ class TraceMem:
         
         return TraceMem._SHARED_BACKEND
 
+    def _concurrency_gate(self, name: str, latency_target: float):
+        if not self.config.adaptive_concurrency:
+            return None
+        with TraceMem._GLOBAL_DB_LOCK:
+            if name not in TraceMem._SHARED_CONCURRENCY:
+                TraceMem._SHARED_CONCURRENCY[name] = AdaptiveConcurrencyLimiter(
+                    name=name,
+                    initial_limit=self.config.adaptive_initial_limit,
+                    max_limit=self.config.adaptive_max_limit,
+                    latency_target=latency_target)
+        return TraceMem._SHARED_CONCURRENCY[name]
+
+    def concurrency_snapshot(self) -> Dict:
+        """Current in-flight limits and their history, for monitoring"""
+        return {name: gate.snapshot() for name, gate in TraceMem._SHARED_CONCURRENCY.items()}
+
+    def usage_snapshot(self) -> Dict:
+        """Calls, tokens, retries and latency per stage for this instance"""
+        return self.usage.snapshot()
+
+    def reset_usage(self) -> None:
+        self.usage.reset()
+
+    @property
+    def rate_limiter(self):
+        config = self.config
+        if not any((config.llm_rpm_limit, config.llm_tpm_limit,
+                    config.embedding_rpm_limit, config.embedding_tpm_limit)):
+            return None
+        limiter = RateLimiter.shared()
+        limiter.configure(config.llm_model, rpm=config.llm_rpm_limit, tpm=config.llm_tpm_limit)
+        limiter.configure(config.embedding_model, rpm=config.embedding_rpm_limit, tpm=config.embedding_tpm_limit)
+        return limiter
+
+    @property
+    def llm_cache(self):
+        if not self.config.llm_cache_enabled:
+            return None
+        if TraceMem._SHARED_LLM_CACHE is None:
+            with TraceMem._GLOBAL_DB_LOCK:
+                if TraceMem._SHARED_LLM_CACHE is None:
+                    from ..cache.sqlite_cache import LLMResponseCache
+                    TraceMem._SHARED_LLM_CACHE = LLMResponseCache(path=self.config.llm_cache_path,
+                                                                  max_bytes=self.config.llm_cache_max_bytes)
+        return TraceMem._SHARED_LLM_CACHE
+
+    @property
+    def embedding_cache(self):
+        if not self.config.embedding_cache_enabled:
+            return None
+        if TraceMem._SHARED_EMBEDDING_CACHE is None:
+            with TraceMem._GLOBAL_DB_LOCK:
+                if TraceMem._SHARED_EMBEDDING_CACHE is None:
+                    from ..cache.sqlite_cache import EmbeddingCache
+                    TraceMem._SHARED_EMBEDDING_CACHE = EmbeddingCache(path=self.config.embedding_cache_path,
+                                                                      max_bytes=self.config.embedding_cache_max_bytes)
+        return TraceMem._SHARED_EMBEDDING_CACHE
+
+    @property
+    def journal(self):
+        if not self.config.ingestion_journal_enabled:
+            return None
+        if TraceMem._SHARED_JOURNAL is None:
+            with TraceMem._GLOBAL_DB_LOCK:
+                if TraceMem._SHARED_JOURNAL is None:
+                    TraceMem._SHARED_JOURNAL = IngestionJournal(path=self.config.ingestion_journal_path)
+        return TraceMem._SHARED_JOURNAL
+
+    @property
+    def card_cache(self):
+        if TraceMem._SHARED_CARD_CACHE is None:
+            with TraceMem._GLOBAL_DB_LOCK:
+                if TraceMem._SHARED_CARD_CACHE is None:
+                    from ..cache.card_cache import CardCache
+                    TraceMem._SHARED_CARD_CACHE = CardCache(max_entries=self.config.card_cache_size)
+        return TraceMem._SHARED_CARD_CACHE
+
+    @property
+    def async_backend(self):
+        return self.reason_agent.async_backend
+
     @property
     def chroma_client(self):
         if TraceMem._SHARED_CHROMA_INDEX is None:
@@ -85,6 +203,8 @@ class TraceMem:
             user_id=roles,
             timestamp=time_stamp,
             summary=topic['summary'])
+        if self.config.deterministic_ids:
+            episode_memory.assign_content_id()
         return episode_memory
     
     def create_semantic_memory(self, 
@@ -101,6 +221,8 @@ class TraceMem:
                     user_id=f"{roles}_{speaker}",
                     timestamp=time_stamp,
                     source_episode=episode_id)
+                if self.config.deterministic_ids:
+                    semantic.assign_content_id()
                 all_semantic_memories.append(semantic)
         return all_semantic_memories
     
@@ -119,21 +241,26 @@ class TraceMem:
                     user_id=f"{roles}_{person}",
                     source_episode=episode_id,
                     timestamp=time_stamp)  
+                if self.config.deterministic_ids:
+                    experience_memory.assign_content_id()
                 all_experiences.append(experience_memory)
         return all_experiences
 
 
+    @traced()
     def add_session(self, 
                     topics: List[Dict],
                     roles: str,
                     time_stamp: str) -> None:
-        for topic in topics:
-            self._process_single_topic(topic, roles, time_stamp)
+        # topics are written concurrently, failures are collected per topic
+        ordered_map(lambda topic: self._process_single_topic(topic, roles, time_stamp),
+                    topics,
+                    max_workers=self.config.max_workers)
 
-    def _process_single_topic(self, 
-                              topic: Dict, 
-                              roles: str, 
-                              time_stamp: str) -> None:
+    def _build_topic_memories(self,
+                              topic: Dict,
+                              roles: str,
+                              time_stamp: str):
         # create one episode memory
         episode_memory = self.create_episode_memory(
                               roles=roles,
@@ -156,11 +283,19 @@ class TraceMem:
             experiences=topic['experience'],
             time_stamp=time_stamp,
             episode_id=episode_id)
+        return episode_memory, all_semantic_memories, all_experiences
+
+    def _process_single_topic(self, 
+                              topic: Dict, 
+                              roles: str, 
+                              time_stamp: str) -> None:
+        episode_memory, all_semantic_memories, all_experiences = self._build_topic_memories(
+            topic=topic, roles=roles, time_stamp=time_stamp)
             
-        # save to chromadb, here needs a write block
-        self.chroma_client.add_episode(roles=roles, episode=episode_memory)
-        self.chroma_client.add_semantic(memory=all_semantic_memories)
-        self.chroma_client.add_experience(memory=all_experiences)
+        # save to chromadb in one bulk write: one embedding call for the whole topic
+        self.chroma_client.add_batch(episodes=[episode_memory],
+                                     semantic=all_semantic_memories,
+                                     experience=all_experiences)
 
         # save to redis cache (if you want to use cache or you want to use BM25 search)
         # self.redis_manager.save_episode(
@@ -169,17 +304,204 @@ class TraceMem:
         #     episode_data=episode_memory)        
         # self.redis_manager.save_semantic_memory( semantic_data=all_semantic_memories)
     
+    @traced()
+    def _segment_stage(self, job: SessionJob) -> None:
+        if self.config.one_shot_ingestion and len(job.messages) <= self.config.one_shot_max_messages:
+            # short session: topics, summaries and experiences from one call
+            topics = self.session_extractor.session_topics(messages=job.messages)
+            if topics is not None:
+                job.topics = topics
+                return
+        job.topics = self.topic_segmentor.topic_segment_session(messages=job.messages)
+
+    @traced()
+    def _summary_stage(self, job: SessionJob) -> None:
+        if job.topics and all('summary' in topic for topic in job.topics):
+            return
+        if self.config.fused_topic_extraction:
+            # summary and experiences in one call per topic, extract stage becomes a no-op
+            job.topics = self.fused_extractor.episodes_experiences(topics=job.topics, messages=job.messages)
+            return
+        job.topics = self.summarizer.episodes_summary(topics=job.topics, mesaages=job.messages)
+
+    @traced()
+    def _extract_stage(self, job: SessionJob) -> None:
+        if job.topics and all('experience' in topic for topic in job.topics):
+            return
+        job.topics = self.extrator.experiences_extraction(topics=job.topics)
+
+    def _journaled_stage(self, stage: str, func, roles: str):
+        # skip stages a previous run already finished, checkpoint the ones we run
+        def run(job: SessionJob) -> None:
+            stages = IngestionJournal.STAGES
+            if job.completed_stage is not None and stages.index(job.completed_stage) >= stages.index(stage):
+                return
+            func(job)
+            job.completed_stage = stage
+            if self.journal is not None:
+                self.journal.record_stage(roles, job.key, job.content_hash, stage, job.topics)
+        return run
+
+    @traced()
+    def _commit_session(self, job: SessionJob, roles: str) -> None:
+        journal = self.journal
+        if journal is None:
+            self.add_session(topics=job.topics, roles=roles, time_stamp=job.time_stamp)
+            return
+
+        written = journal.written_topics(roles, job.key, job.content_hash)
+
+        def write_topic(item):
+            topic_index, topic = item
+            if topic_index in written:
+                return
+            self._process_single_topic(topic, roles, job.time_stamp)
+            journal.record_topic(roles, job.key, job.content_hash, topic_index)
+
+        ordered_map(write_topic, list(enumerate(job.topics)), max_workers=self.config.max_workers)
+        journal.mark_committed(roles, job.key, job.content_hash)
+
+    def _session_jobs(self, sessions: Dict, roles: str) -> List[SessionJob]:
+        # one job per session, journaled sessions skip or resume what a previous run finished
+        journal = self.journal
+        jobs = []
+        for key, value in sessions.items(): 
+            time_stamp = sessions.get(key, [{}])[0].get('metadata', {}).get('dataset_timestamp')
+            job = SessionJob(index=len(jobs), key=key, messages=value, time_stamp=time_stamp)
+            if journal is not None:
+                job.content_hash = IngestionJournal.session_hash(value)
+                if journal.is_committed(roles, key, job.content_hash):
+                    logger.info(f"Session {key} of {roles} already committed, skipping")
+                    continue
+                job.completed_stage, topics = journal.last_stage(roles, key, job.content_hash)
+                if topics is not None:
+                    job.topics = topics
+                    logger.info(f"Resuming session {key} of {roles} after stage {job.completed_stage}")
+            jobs.append(job)
+        return jobs
+
+    @traced()
     def add_memories(self, 
                      sessions: List[Dict], 
                      roles: str) -> None:
-        for key, value in sessions.items(): 
-            time_stamp = sessions.get(key, [{}])[0].get('metadata', {}).get('dataset_timestamp')
-            topics = self.topic_segmentor.topic_segment_session(messages=value)
-            topics = self.summarizer.episodes_summary(topics=topics, mesaages=value)
-            topics = self.extrator.experiences_extraction(topics=topics)
-            self.add_session(topics=topics, roles=roles, time_stamp=time_stamp)
+        # sessions flow through bounded stage queues, the write stage commits them in input (timestamp) order
+        jobs = self._session_jobs(sessions, roles)
+        pipeline = SessionPipeline(
+            stages=[("segment", self._journaled_stage("segment", self._segment_stage, roles), self.config.pipeline_segment_workers),
+                    ("summary", self._journaled_stage("summary", self._summary_stage, roles), self.config.pipeline_summary_workers),
+                    ("extract", self._journaled_stage("extract", self._extract_stage, roles), self.config.pipeline_extract_workers)],
+            commit=lambda job: self._commit_session(job, roles),
+            queue_size=self.config.pipeline_queue_size)
+        pipeline.run(jobs)
+
+
+    async def _aprocess_single_topic(self,
+                                     topic: Dict,
+                                     roles: str,
+                                     time_stamp: str) -> None:
+        episode_memory, all_semantic_memories, all_experiences = self._build_topic_memories(
+            topic=topic, roles=roles, time_stamp=time_stamp)
+        await self.async_backend.add_memories_batch(episodes=[episode_memory],
+                                                    semantic_memories=all_semantic_memories,
+                                                    experience_memories=all_experiences)
+
+    @traced()
+    async def aadd_session(self,
+                           topics: List[Dict],
+                           roles: str,
+                           time_stamp: str) -> None:
+        await aordered_map(lambda topic: self._aprocess_single_topic(topic, roles, time_stamp),
+                           topics,
+                           max_workers=self.config.max_workers)
+
+    @traced()
+    async def _asegment_stage(self, job: SessionJob) -> None:
+        if self.config.one_shot_ingestion and len(job.messages) <= self.config.one_shot_max_messages:
+            # the one-shot extractor is sync only, run it in a worker thread
+            topics = await asyncio.to_thread(self.session_extractor.session_topics, messages=job.messages)
+            if topics is not None:
+                job.topics = topics
+                return
+        job.topics = await self.topic_segmentor.atopic_segment_session(messages=job.messages)
 
+    @traced()
+    async def _asummary_stage(self, job: SessionJob) -> None:
+        if job.topics and all('summary' in topic for topic in job.topics):
+            return
+        if self.config.fused_topic_extraction:
+            job.topics = await asyncio.to_thread(self.fused_extractor.episodes_experiences,
+                                                 topics=job.topics, messages=job.messages)
+            return
+        job.topics = await self.summarizer.aepisodes_summary(topics=job.topics, mesaages=job.messages)
 
+    @traced()
+    async def _aextract_stage(self, job: SessionJob) -> None:
+        if job.topics and all('experience' in topic for topic in job.topics):
+            return
+        job.topics = await self.extrator.aexperiences_extraction(topics=job.topics)
+
+    async def _arun_stages(self, job: SessionJob, roles: str) -> None:
+        # same stage selection and journal checkpoints as _journaled_stage
+        stages = IngestionJournal.STAGES
+        for stage, func in zip(stages, (self._asegment_stage, self._asummary_stage, self._aextract_stage)):
+            if job.completed_stage is not None and stages.index(job.completed_stage) >= stages.index(stage):
+                continue
+            await func(job)
+            job.completed_stage = stage
+            if self.journal is not None:
+                await asyncio.to_thread(self.journal.record_stage, roles, job.key, job.content_hash, stage, job.topics)
+
+    @traced()
+    async def _acommit_session(self, job: SessionJob, roles: str) -> None:
+        journal = self.journal
+        if journal is None:
+            await self.aadd_session(topics=job.topics, roles=roles, time_stamp=job.time_stamp)
+            return
+
+        written = await asyncio.to_thread(journal.written_topics, roles, job.key, job.content_hash)
+
+        async def write_topic(item):
+            topic_index, topic = item
+            if topic_index in written:
+                return
+            await self._aprocess_single_topic(topic, roles, job.time_stamp)
+            await asyncio.to_thread(journal.record_topic, roles, job.key, job.content_hash, topic_index)
+
+        await aordered_map(write_topic, list(enumerate(job.topics)), max_workers=self.config.max_workers)
+        await asyncio.to_thread(journal.mark_committed, roles, job.key, job.content_hash)
+
+    @traced()
+    async def aadd_memories(self,
+                            sessions: List[Dict],
+                            roles: str) -> None:
+        # up to one session per pipeline worker runs its stages concurrently,
+        # sessions are committed in input (timestamp) order like add_memories
+        jobs = await asyncio.to_thread(self._session_jobs, sessions, roles)
+        window = max(1, self.config.pipeline_segment_workers +
+                        self.config.pipeline_summary_workers +
+                        self.config.pipeline_extract_workers)
+        running = deque()
+        try:
+            for job in jobs:
+                running.append((job, asyncio.create_task(self._arun_stages(job, roles))))
+                if len(running) >= window:
+                    await self._acommit_next(running, roles)
+            while running:
+                await self._acommit_next(running, roles)
+        finally:
+            for _, task in running:
+                task.cancel()
+
+    async def _acommit_next(self, running: deque, roles: str) -> None:
+        job, task = running.popleft()
+        try:
+            await task
+        except Exception as e:
+            logger.error(f"Session {job.key} failed: {type(e).__name__}: {e}")
+            raise
+        await self._acommit_session(job, roles)
+
+    @traced()
     def build_personal_card(self,
                             user_id: str,
                             roles: str) -> None:
@@ -198,6 +520,7 @@ class TraceMem:
             os.makedirs(self.config.cards_dir, exist_ok=True)
         with open(os.path.join(self.config.cards_dir,f"{roles}_{user_id}.json"), 'w', encoding='utf-8') as f:
             f.write(card)      
+        self.reason_agent.invalidate_card(os.path.join(self.config.cards_dir, f"{roles}_{user_id}.json"))
 
         thread_map = json.dumps(self.clusterer.thread_map, ensure_ascii=False, indent=2)
         with open(os.path.join(self.config.cards_dir,f"{roles}_{user_id}_thread_map.json"), 'w', encoding='utf-8') as f:
@@ -214,6 +537,7 @@ class TraceMem:
                                  roles=roles)  
 
     
+    @traced()
     def answer(self, 
                question: str, 
                speakers: List[str]) -> str:
@@ -221,3 +545,41 @@ class TraceMem:
         response = self.reason_agent.answer(question=question,
                                             speakers=speakers)
         return response
+
+    @traced()
+    async def aanswer(self,
+                      question: str,
+                      speakers: List[str]) -> str:
+
+        response = await self.reason_agent.aanswer(question=question,
+                                                   speakers=speakers)
+        return response
+
+    @traced()
+    def answer_batch(self,
+                     questions: List[str],
+                     speakers: List[str],
+                     max_workers: Optional[int] = None) -> List[Optional[str]]:
+        # one answer per question in input order, None where that question failed
+        responses = self.reason_agent.answer_batch(questions=questions,
+                                                   speakers=speakers,
+                                                   max_workers=max_workers)
+        return responses
+
+    def answer_stream(self,
+                      question: str,
+                      speakers: List[str],
+                      on_stage=None) -> Iterator[str]:
+        # tokens of the final answer as they arrive, on_stage(stage, seconds) reports progress
+        yield from self.reason_agent.answer_stream(question=question,
+                                                   speakers=speakers,
+                                                   on_stage=on_stage)
+
+    async def aanswer_stream(self,
+                             question: str,
+                             speakers: List[str],
+                             on_stage=None) -> AsyncIterator[str]:
+        async for token in self.reason_agent.aanswer_stream(question=question,
+                                                            speakers=speakers,
+                                                            on_stage=on_stage):
+            yield token
@@ -1,11 +1,14 @@
 from .prompts import PERSONA_MODEL_PROMPT
 from ..configs.client import Client
+from ..utils.parallel import ordered_map, aordered_map
+from ..utils.tracing import traced
 from typing import Dict, List
 import json
 
 class PersonaExtractor:
-    def __init__(self, llm_client: Client):
+    def __init__(self, llm_client: Client, max_workers: int = 1):
         self.llm_client = llm_client
+        self.max_workers = max_workers
     
     def format_experience_prompt(self, 
                                  topic: Dict,
@@ -37,15 +40,52 @@ class PersonaExtractor:
         
         return formatted_input
         
+    @traced()
+    def experience_extraction(self, topic: Dict, speaker: str) -> Dict:
+        input_prompt = self.format_experience_prompt(topic,speaker)       
+        experience = self.llm_client.client_response(system_prompt=PERSONA_MODEL_PROMPT, input_prompt=input_prompt, stage="persona")
+        try:
+            return json.loads(experience)
+        except (json.JSONDecodeError, TypeError):
+            # do not replay the malformed completion from the cache on the next run
+            self.llm_client.forget_response(PERSONA_MODEL_PROMPT, input_prompt)
+            raise
+
+    @traced()
     def experiences_extraction(self, topics: List[Dict]) -> List[Dict]:
+        # one independent call per (topic, speaker), results are put back in order
+        jobs = [(topic, speaker) for topic in topics for speaker in topic['semantic_memories'].keys()]
+        experiences = ordered_map(lambda job: self.experience_extraction(*job),
+                                  jobs,
+                                  max_workers=self.max_workers)
+        
         for topic in topics:
-            speakers = topic['semantic_memories'].keys()
             topic['experience'] = {}
-            
-            for speaker in speakers:
-                input_prompt = self.format_experience_prompt(topic,speaker)       
-                experience = self.llm_client.client_response(system_prompt=PERSONA_MODEL_PROMPT, input_prompt=input_prompt)
-                experience = json.loads(experience)
-                topic['experience'][speaker] = experience
-
-        return topics
\ No newline at end of file
+        for (topic, speaker), experience in zip(jobs, experiences):
+            topic['experience'][speaker] = experience
+
+        return topics
+
+    @traced()
+    async def aexperience_extraction(self, topic: Dict, speaker: str) -> Dict:
+        input_prompt = self.format_experience_prompt(topic,speaker)
+        experience = await self.llm_client.aclient_response(system_prompt=PERSONA_MODEL_PROMPT, input_prompt=input_prompt, stage="persona")
+        try:
+            return json.loads(experience)
+        except (json.JSONDecodeError, TypeError):
+            await self.llm_client.aforget_response(PERSONA_MODEL_PROMPT, input_prompt)
+            raise
+
+    @traced()
+    async def aexperiences_extraction(self, topics: List[Dict]) -> List[Dict]:
+        jobs = [(topic, speaker) for topic in topics for speaker in topic['semantic_memories'].keys()]
+        experiences = await aordered_map(lambda job: self.aexperience_extraction(*job),
+                                         jobs,
+                                         max_workers=self.max_workers)
+
+        for topic in topics:
+            topic['experience'] = {}
+        for (topic, speaker), experience in zip(jobs, experiences):
+            topic['experience'][speaker] = experience
+
+        return topics
@@ -0,0 +1,146 @@
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+import contextvars
+import queue
+import threading
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+_STOP = object()
+
+
+@dataclass
+class SessionJob:
+    """One session travelling through the ingestion stages"""
+    index: int
+    key: str
+    messages: List[Dict]
+    time_stamp: Optional[str]
+    topics: List[Dict] = field(default_factory=list)
+    content_hash: str = ""
+    completed_stage: Optional[str] = None
+    error: Optional[BaseException] = None
+    failed_stage: Optional[str] = None
+
+
+class SessionPipeline:
+    """
+    Producer/consumer pipeline that lets different sessions sit in different stages.
+
+    Every stage has its own worker pool and reads from a bounded queue, so a slow
+    stage applies backpressure instead of buffering whole conversations. The final
+    commit step runs on a single thread and commits jobs strictly in input order;
+    once a job fails, no later job is committed and the first error is re-raised.
+    Admission is bounded as well: at most `queue_size` jobs per queue plus one per
+    worker can be past the producer and not yet committed, so a slow early session
+    cannot make later ones pile up, finished, in front of the commit step.
+    """
+
+    def __init__(self,
+                 stages: List[Tuple[str, Callable[[SessionJob], None], int]],
+                 commit: Callable[[SessionJob], None],
+                 queue_size: int = 2):
+        self.stages = stages
+        self.commit = commit
+        self.queue_size = max(1, queue_size)
+        self._abort = threading.Event()
+
+    def _stage_worker(self,
+                      name: str,
+                      func: Callable[[SessionJob], None],
+                      inbox: queue.Queue,
+                      outbox: queue.Queue,
+                      finished: Dict[str, int],
+                      workers: int,
+                      next_workers: int,
+                      lock: threading.Lock) -> None:
+        while True:
+            job = inbox.get()
+            if job is _STOP:
+                break
+            if job.error is None and not self._abort.is_set():
+                try:
+                    func(job)
+                except Exception as e:
+                    logger.error(f"Session {job.key} failed in stage {name}: {type(e).__name__}: {e}")
+                    job.error, job.failed_stage = e, name
+            outbox.put(job)
+
+        # the last worker of a stage shuts down the next one
+        with lock:
+            finished[name] += 1
+            last = finished[name] == workers
+        if last:
+            for _ in range(next_workers):
+                outbox.put(_STOP)
+
+    def _commit_worker(self,
+                       inbox: queue.Queue,
+                       errors: List[BaseException],
+                       admitted: threading.Semaphore) -> None:
+        pending: Dict[int, SessionJob] = {}
+        next_index = 0
+        while True:
+            job = inbox.get()
+            if job is _STOP:
+                break
+            pending[job.index] = job
+            while next_index in pending:
+                job = pending.pop(next_index)
+                next_index += 1
+                admitted.release()
+                if errors or self._abort.is_set():
+                    continue
+                if job.error is not None:
+                    errors.append(job.error)
+                    self._abort.set()
+                    continue
+                try:
+                    self.commit(job)
+                except Exception as e:
+                    logger.error(f"Session {job.key} failed in stage commit: {type(e).__name__}: {e}")
+                    errors.append(e)
+                    self._abort.set()
+
+    def run(self, jobs: List[SessionJob]) -> None:
+        self._abort.clear()
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        finished = {name: 0 for name, _, _ in self.stages}
+        lock = threading.Lock()
+        errors: List[BaseException] = []
+        # bounds index - next_index in the commit worker's reorder buffer
+        admitted = threading.Semaphore(self.queue_size * len(queues) +
+                                       sum(max(1, workers) for _, _, workers in self.stages))
+
+        threads = []
+        for idx, (name, func, workers) in enumerate(self.stages):
+            workers = max(1, workers)
+            next_workers = max(1, self.stages[idx + 1][2]) if idx + 1 < len(self.stages) else 1
+            for _ in range(workers):
+                # workers inherit the caller's context so trace spans nest under it
+                threads.append(threading.Thread(
+                    target=contextvars.copy_context().run,
+                    args=(self._stage_worker, name, func, queues[idx], queues[idx + 1], finished, workers, next_workers, lock),
+                    name=f"tracemem-{name}",
+                    daemon=True))
+        threads.append(threading.Thread(target=contextvars.copy_context().run,
+                                        args=(self._commit_worker, queues[-1], errors, admitted),
+                                        name="tracemem-commit",
+                                        daemon=True))
+        for thread in threads:
+            thread.start()
+
+        # producer: bounded put blocks while the first stage is saturated
+        for job in jobs:
+            admitted.acquire()
+            queues[0].put(job)
+        for _ in range(max(1, self.stages[0][2]) if self.stages else 1):
+            queues[0].put(_STOP)
+
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            raise errors[0]
@@ -305,3 +305,82 @@ OUTPUT (include your reason and answer):
 "...."
 """
 
+
+
+EPISODE_EXPERIENCE_PROMPT="""
+TASK: Topic Summarizer and Persona Slice Extraction
+
+INPUT:
+Current Time: <exact time>
+person a: <text of person a>
+person b: <text of person b>
+...
+Labeled Semantic Memories:
+person a: ...
+person b: ...
+
+PART 1 - Summary:
+1. Must incorporate all keywords and topics discussed.
+2. **DO NOT OMIT any information**. Be exhaustive and detail-oriented, include but not limited to names, activity, attributes (e.g., colors, locations), and other essential details.
+3. Describe in detail who did what at what point in time (if time mentions), or who did what with whom and when (if mentions).
+4. If someone shows images, includes all the information of the image. Use format [Who] shows [What content].
+5. Include **global time**(eg. As of 10 December, 2020) and any **relative time information** (eg. yesterday, last year).
+
+PART 2 - Personal Experience Analysis (one entry for EVERY speaker listed under "Speakers"):
+   Experience: A chronological log of CONCRETE biographical facts about the speaker's OWN life.
+   - Exclude information that is not relevant to the speaker's own life (eg. acknowledgments, social pleasantries and greetings). MUST return "N/A" if no personal experiences are found.
+   - Extract ONLY information that belongs in the speaker's own life (eg. possessions, actions, emotions, events, activities, habits, plans, routines, facts about themselves).
+   - Even if a personal fact is mentioned during a topic about another person's experience, the factual part about the speaker MUST be extracted.
+   - Combine the summary and the speaker's semantic memories, be exhaustive and DON'T OMIT any specific information (eg. names, activities, colors, times).
+   - Must include image/photo details as original memories (e.g., names, colors). **Use format: Image: ...**
+   - You MUST include the **global timestamp** and **any relative time information**.
+
+OUTPUT FORMAT (pure valid JSON, no markdown code blocks):
+{
+  "summary": "As of ..., ...",
+  "experiences": {
+    "<speaker name>": {"Experience": "As of..., [detailed experience description]" or "N/A"}
+  }
+}
+"""
+
+
+SESSION_PROMPT="""
+TASK: Whole-session Topic Segmentation, Summarization, Semantic Memory and Persona Slice Extraction
+
+INPUT:
+Current Time: <exact time>
+<D1>speaker: text</D1>
+<D2>speaker: text</D2>
+...
+
+STEP 1 - Topics: Split the dialogue into consecutive topics that together cover D1..Dn without gaps or overlaps.
+   - Start a new topic whenever a speaker introduces ANY new subject, activity or a "by the way" moment.
+   - Do not let 10 consecutive lines accumulate without a topic change.
+
+STEP 2 - Semantic memories (per topic, per speaker):
+   - Focus on **WHO** **does/feels** **WHAT**, **WHEN**, **WHERE**. Be exhaustive, keep emotional adjectives and contextual nuances.
+   - DON'T OMIT any details from images, including names, colors, and any other description. **Use format [Image: ...]**
+
+STEP 3 - Summary (per topic):
+   - Incorporate all keywords; describe who did what with whom and when. **DO NOT OMIT any information**.
+   - Include **global time** (eg. As of 10 December, 2020) and any **relative time information**.
+
+STEP 4 - Experience (per topic, for every speaker that has semantic memories in the topic):
+   - CONCRETE biographical facts about the speaker's OWN life (possessions, actions, emotions, events, plans, routines).
+   - Exclude pleasantries and greetings. MUST return "N/A" if no personal experiences are found.
+   - Include image/photo details (**Use format: Image: ...**), the **global timestamp** and **any relative time information**.
+
+OUTPUT FORMAT (pure valid JSON, no markdown code blocks):
+{
+  "topics": [
+    {
+      "start": <first D index>,
+      "end": <last D index>,
+      "summary": "As of ..., ...",
+      "semantic_memories": {"<speaker name>": ["...", "..."]},
+      "experiences": {"<speaker name>": {"Experience": "As of..., ..." or "N/A"}}
+    }
+  ]
+}
+"""
@@ -1,6 +1,7 @@
 import re
 from ..configs.client import Client
 from .prompts import SEGMENT_PROMPT
+from ..utils.tracing import traced
 from typing import List
 
 class TopicSegmentor:
@@ -108,10 +109,19 @@ class TopicSegmentor:
             })
         return topics
 
+    @traced()
     def topic_segment_session(self, messages: List[str]):
         input_prompt,speakers = self.format_segment_prompt(messages)
         result = self.llm_client.client_response(system_prompt=SEGMENT_PROMPT,
-                                                 input_prompt=input_prompt)
+                                                 input_prompt=input_prompt,
+                                                 stage="segment")
         topics = self.extract_topics(result,speakers)        
         return topics
-    
\ No newline at end of file
+
+    @traced()
+    async def atopic_segment_session(self, messages: List[str]):
+        input_prompt,speakers = self.format_segment_prompt(messages)
+        result = await self.llm_client.aclient_response(system_prompt=SEGMENT_PROMPT,
+                                                        input_prompt=input_prompt,
+                                                        stage="segment")
+        return self.extract_topics(result,speakers)
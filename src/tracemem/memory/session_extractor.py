@@ -0,0 +1,100 @@
+from .prompts import SESSION_PROMPT
+from .segmenter import TopicSegmentor
+from ..configs.client import Client
+from ..utils.tracing import traced
+from typing import Dict, Iterable, List, Optional
+import json
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class SessionExtractor:
+    """Segment, summarize and extract a short session with a single LLM call"""
+
+    def __init__(self, llm_client: Client, segmentor: TopicSegmentor):
+        self.llm_client = llm_client
+        self.segmentor = segmentor
+
+    @staticmethod
+    def parse_session_response(response: str, n_messages: int, speakers: Iterable[str]) -> Optional[List[Dict]]:
+        """
+        Turn the one-shot response into add_session topic dicts, None if it does not validate.
+
+        Memories may only be keyed by `speakers` of the session (an invented or
+        misspelled name would open a stray per-user collection and card), topic
+        ranges must not overlap, and at least one topic must carry memories.
+        """
+        speakers = set(speakers)
+        try:
+            result = json.loads(response)
+        except (json.JSONDecodeError, TypeError):
+            return None
+        raw_topics = result.get('topics') if isinstance(result, dict) else None
+        if not isinstance(raw_topics, list):
+            return None
+
+        topics = []
+        ranges = []
+        for raw in raw_topics:
+            if not isinstance(raw, dict):
+                return None
+            start, end = raw.get('start'), raw.get('end')
+            if not isinstance(start, int) or not isinstance(end, int) or not 1 <= start <= end <= n_messages:
+                return None
+            ranges.append((start, end))
+
+            summary = raw.get('summary')
+            semantic = raw.get('semantic_memories')
+            experiences = raw.get('experiences')
+            if not isinstance(summary, str) or not isinstance(semantic, dict) or not isinstance(experiences, dict):
+                return None
+            if not speakers.issuperset(semantic) or not speakers.issuperset(experiences):
+                return None
+
+            semantic_dict = {}
+            for speaker, memories in semantic.items():
+                if isinstance(memories, str):
+                    memories = [memories]
+                if not isinstance(memories, list) or not all(isinstance(m, str) for m in memories):
+                    return None
+                memories = [m.strip() for m in memories if m.strip()]
+                if memories:
+                    semantic_dict[speaker] = memories
+            if not semantic_dict:
+                continue
+
+            experience = {}
+            for speaker in semantic_dict:
+                speaker_experience = experiences.get(speaker, {"Experience": "N/A"})
+                if isinstance(speaker_experience, str):
+                    speaker_experience = {"Experience": speaker_experience}
+                if not isinstance(speaker_experience, dict) or not isinstance(speaker_experience.get('Experience'), str):
+                    return None
+                experience[speaker] = speaker_experience
+
+            topics.append({
+                'range': (start - 1, end - 1),
+                'semantic_memories': semantic_dict,
+                'count': sum(len(memories) for memories in semantic_dict.values()),
+                'summary': summary,
+                'experience': experience
+            })
+
+        ranges.sort()
+        if any(start <= prev_end for (_, prev_end), (start, _) in zip(ranges, ranges[1:])):
+            return None
+        # nothing usable survived: let the staged path try instead of dropping the session
+        return topics or None
+
+    @traced()
+    def session_topics(self, messages: List[Dict]) -> Optional[List[Dict]]:
+        input_prompt, speakers = self.segmentor.format_segment_prompt(messages)
+        response = self.llm_client.client_response(system_prompt=SESSION_PROMPT,
+                                                   input_prompt=input_prompt,
+                                                   stage="session")
+        topics = self.parse_session_response(response, len(messages), speakers)
+        if topics is None:
+            logger.warning("One-shot session extraction returned an invalid shape, falling back to staged path")
+            self.llm_client.forget_response(SESSION_PROMPT, input_prompt)
+        return topics
@@ -1,10 +1,13 @@
 from ..configs.client import Client
 from typing import Dict, List
 from .prompts import EPISODE_PROMPT
+from ..utils.parallel import ordered_map, aordered_map
+from ..utils.tracing import traced
 
 class Summarizer:
-    def __init__(self, llm_client: Client):
+    def __init__(self, llm_client: Client, max_workers: int = 1):
         self.llm_client = llm_client
+        self.max_workers = max_workers
 
     def format_episode_prompt(self,dialogue_data):
         if not dialogue_data:
@@ -32,12 +35,34 @@ class Summarizer:
             lines.append(f"{role}: {content}")
         return "\n".join(lines)
     
+    @traced()
+    def episode_summary(self, topic: Dict, mesaages: List[str]) -> str:
+        sidx,eidx = topic['range'][0], topic['range'][1]
+        msgs = mesaages[sidx:eidx+1]
+        input_prompt = self.format_episode_prompt(msgs)            
+        return self.llm_client.client_response(system_prompt=EPISODE_PROMPT, input_prompt=input_prompt, stage="episode")
+
+    @traced()
     def episodes_summary(self, topics:List[Dict], mesaages:List[str]) -> Dict:
-        for topic in topics:
-            sidx,eidx = topic['range'][0], topic['range'][1]
-            msgs = mesaages[sidx:eidx+1]
-            input_prompt = self.format_episode_prompt(msgs)            
-            summary = self.llm_client.client_response(system_prompt=EPISODE_PROMPT, input_prompt=input_prompt)
+        # topic summaries are independent, fan them out and keep topic order
+        summaries = ordered_map(lambda topic: self.episode_summary(topic, mesaages),
+                                topics,
+                                max_workers=self.max_workers)
+        for topic, summary in zip(topics, summaries):
+            topic['summary'] = summary
+        return topics
+
+    @traced()
+    async def aepisode_summary(self, topic: Dict, mesaages: List[str]) -> str:
+        sidx,eidx = topic['range'][0], topic['range'][1]
+        input_prompt = self.format_episode_prompt(mesaages[sidx:eidx+1])
+        return await self.llm_client.aclient_response(system_prompt=EPISODE_PROMPT, input_prompt=input_prompt, stage="episode")
+
+    @traced()
+    async def aepisodes_summary(self, topics:List[Dict], mesaages:List[str]) -> Dict:
+        summaries = await aordered_map(lambda topic: self.aepisode_summary(topic, mesaages),
+                                       topics,
+                                       max_workers=self.max_workers)
+        for topic, summary in zip(topics, summaries):
             topic['summary'] = summary
         return topics
-    
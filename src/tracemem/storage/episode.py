@@ -2,6 +2,7 @@ from dataclasses import dataclass, field
 from typing import List
 from datetime import datetime
 import uuid
+from .ids import content_id
 
 
 @dataclass
@@ -15,6 +16,10 @@ class Episode:
     timestamp: datetime = field(default_factory=datetime.now)          
     tags: List[str] = field(default_factory=list)          
     
+    def assign_content_id(self) -> 'Episode':
+        self.episode_id = content_id(self.user_id, self.timestamp, self.summary)
+        return self
+
     def __str__(self) -> str:
         return f"Episode(id={self.episode_id}"
     
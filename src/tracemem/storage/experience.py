@@ -2,6 +2,7 @@ from dataclasses import dataclass, field
 from typing import Optional
 from datetime import datetime
 import uuid
+from .ids import content_id
 
 
 @dataclass
@@ -18,6 +19,11 @@ class ExperienceMemory:
     
     updated_at: Optional[datetime] = None           
 
+    def assign_content_id(self) -> 'ExperienceMemory':
+        self.memory_id = content_id(self.user_id, self.source_episode, self.content, self.timestamp)
+        self.experience_id = self.memory_id
+        return self
+
     def __str__(self) -> str:
         return f"Experience(id={self.memory_id}"
     
@@ -0,0 +1,9 @@
+import uuid
+
+TRACEMEM_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_DNS, "tracemem")
+
+
+def content_id(*parts) -> str:
+    """Deterministic uuid5 derived from the given parts, stable across runs"""
+    key = "\x1f".join("" if part is None else str(part) for part in parts)
+    return str(uuid.uuid5(TRACEMEM_NAMESPACE, key))
@@ -2,6 +2,7 @@ from dataclasses import dataclass, field
 from typing import Optional
 from datetime import datetime
 import uuid
+from .ids import content_id
 
 
 @dataclass
@@ -18,6 +19,10 @@ class SemanticMemory:
     updated_at: Optional[datetime] = None              
     revision_count: int = 1                            
     
+    def assign_content_id(self) -> 'SemanticMemory':
+        self.memory_id = content_id(self.user_id, self.source_episode, self.content, self.timestamp)
+        return self
+
     def __str__(self) -> str:
         return f"SemanticMemory(id={self.memory_id}, content={self.content})"
     
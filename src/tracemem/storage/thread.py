@@ -2,6 +2,7 @@ from dataclasses import dataclass, field
 from typing import Optional
 from datetime import datetime
 import uuid
+from .ids import content_id
 
 
 @dataclass
@@ -17,6 +18,11 @@ class ThreadMemory:
     
     updated_at: Optional[datetime] = None           
 
+    def assign_content_id(self) -> 'ThreadMemory':
+        self.thread_id = content_id(self.user_id, self.source_episode, self.content)
+        self.memory_id = self.thread_id
+        return self
+
     def __str__(self) -> str:
         return f"Thread(id={self.memory_id}"
     
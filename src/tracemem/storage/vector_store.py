@@ -0,0 +1,178 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+import json
+import os
+import threading
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+VECTOR_DTYPES = ("float16", "float32")
+
+
+class _VectorFile:
+    """
+    One collection on disk: `<name>.vec` holds raw rows of `dim` values,
+    `<name>.ids` one id per line (line number == row, i.e. the offset index),
+    `<name>.json` the dtype and dimension. Rows are only ever appended; a
+    re-written id gets a new row and the newest row wins.
+    """
+
+    def __init__(self, root: str, name: str, dtype: str):
+        self.vec_path = os.path.join(root, f"{name}.vec")
+        self.ids_path = os.path.join(root, f"{name}.ids")
+        self.meta_path = os.path.join(root, f"{name}.json")
+        self.dtype = np.dtype(dtype)
+        self.dim: Optional[int] = None
+        self.ids: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self._map: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            self.dtype, self.dim = np.dtype(meta["dtype"]), meta["dim"]
+            ids_text = ""
+            if os.path.exists(self.ids_path):
+                with open(self.ids_path, 'r', encoding='utf-8') as f:
+                    ids_text = f.read()
+            # only newline-terminated lines are complete ids
+            self.ids = ids_text.split("\n")[:-1]
+            # a crash between the two appends can leave vector rows (or a partial row)
+            # without ids; cut both files back to the rows they have in common
+            row_bytes = self.dim * self.dtype.itemsize
+            vec_bytes = os.path.getsize(self.vec_path) if os.path.exists(self.vec_path) else 0
+            self.ids = self.ids[:vec_bytes // row_bytes]
+            if vec_bytes != len(self.ids) * row_bytes:
+                logger.warning(f"Truncating {self.vec_path} to {len(self.ids)} rows after an incomplete append")
+                with open(self.vec_path, 'r+b') as f:
+                    f.truncate(len(self.ids) * row_bytes)
+            ids_text_kept = "".join(f"{record_id}\n" for record_id in self.ids)
+            if ids_text != ids_text_kept:
+                logger.warning(f"Truncating {self.ids_path} to {len(self.ids)} ids after an incomplete append")
+                with open(self.ids_path, 'w', encoding='utf-8') as f:
+                    f.write(ids_text_kept)
+            self.rows = {record_id: row for row, record_id in enumerate(self.ids)}
+
+    def append(self, ids: Sequence[str], vectors: np.ndarray) -> None:
+        vectors = np.ascontiguousarray(vectors, dtype=self.dtype)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                with open(self.meta_path, 'w', encoding='utf-8') as f:
+                    json.dump({"dtype": self.dtype.name, "dim": self.dim}, f)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"{self.vec_path} stores dimension {self.dim}, got {vectors.shape[1]}")
+            # vectors first: a torn write leaves unreferenced bytes rather than ids without vectors
+            with open(self.vec_path, 'ab') as f:
+                f.write(vectors.tobytes())
+            with open(self.ids_path, 'a', encoding='utf-8') as f:
+                f.write("".join(f"{record_id}\n" for record_id in ids))
+            for record_id in ids:
+                self.rows[record_id] = len(self.ids)
+                self.ids.append(record_id)
+
+    def matrix(self) -> np.ndarray:
+        """Read-only memmap of every row; remapped only when the file has grown"""
+        with self._lock:
+            n_rows = len(self.ids)
+            if n_rows == 0:
+                return np.empty((0, self.dim or 0), dtype=self.dtype)
+            if self._map is None or self._map.shape[0] != n_rows:
+                self._map = np.memmap(self.vec_path, dtype=self.dtype, mode='r', shape=(n_rows, self.dim))
+            return self._map
+
+    def live(self) -> Tuple[List[str], np.ndarray]:
+        """Latest row of every id; a zero-copy view unless some ids were re-written"""
+        matrix = self.matrix()
+        with self._lock:
+            if len(self.rows) == matrix.shape[0]:
+                return list(self.ids[:matrix.shape[0]]), matrix
+            rows = sorted(self.rows.values())
+            return [self.ids[row] for row in rows], matrix[rows]
+
+
+class MmapVectorStore:
+    """
+    Append-only, memory-mapped embedding files, one per collection.
+
+    Readers get np.memmap views, so vectors are paged in on demand, shared
+    through the OS page cache between worker processes, and cost no
+    resident memory for users that are not being read. Writers are
+    serialized per collection inside a process; run a single writer
+    process per store directory.
+    """
+
+    def __init__(self, root: str, dtype: str = "float16"):
+        if dtype not in VECTOR_DTYPES:
+            raise ValueError(f"Unsupported vector dtype {dtype!r}, expected one of {VECTOR_DTYPES}")
+        self.root = root
+        self.dtype = dtype
+        os.makedirs(root, exist_ok=True)
+        self._files: Dict[str, _VectorFile] = {}
+        self._lock = threading.Lock()
+
+    def _file(self, name: str) -> _VectorFile:
+        with self._lock:
+            if name not in self._files:
+                self._files[name] = _VectorFile(self.root, name, self.dtype)
+            return self._files[name]
+
+    def append(self, name: str, ids: Sequence[str], vectors) -> None:
+        if len(ids):
+            self._file(name).append(ids, np.asarray(vectors))
+
+    def drop(self, name: str) -> None:
+        with self._lock:
+            self._files.pop(name, None)
+        for suffix in (".vec", ".ids", ".json"):
+            path = os.path.join(self.root, f"{name}{suffix}")
+            if os.path.exists(path):
+                os.remove(path)
+
+    def has(self, name: str) -> bool:
+        return os.path.exists(os.path.join(self.root, f"{name}.json"))
+
+    def load(self, name: str) -> Tuple[List[str], np.ndarray]:
+        """(ids, vectors) of a collection, vectors as a read-only memmap view"""
+        return self._file(name).live()
+
+    def get(self, name: str, ids: Sequence[str]) -> np.ndarray:
+        vector_file = self._file(name)
+        rows = [vector_file.rows[record_id] for record_id in ids]
+        return vector_file.matrix()[rows]
+
+    def search(self,
+               name: str,
+               query_embeddings,
+               top_k: int = 10,
+               chunk_rows: int = 65536) -> Tuple[List[List[str]], List[List[float]]]:
+        """
+        Exact cosine top-k straight off the memmap, scanning `chunk_rows` rows
+        at a time so large files never have to be resident at once.
+        Returns (ids, cosine scores) per query.
+        """
+        ids, matrix = self.load(name)
+        queries = np.array(query_embeddings, dtype=np.float32, ndmin=2)
+        queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+
+        for start in range(0, matrix.shape[0], chunk_rows):
+            chunk = np.asarray(matrix[start:start + chunk_rows], dtype=np.float32)
+            norms = np.maximum(np.linalg.norm(chunk, axis=1), 1e-12)
+            scores = (queries @ chunk.T) / norms
+            rows = np.broadcast_to(np.arange(start, start + len(chunk)), scores.shape)
+            scores = np.concatenate([best_scores, scores], axis=1)
+            rows = np.concatenate([best_rows, rows], axis=1)
+            k = min(top_k, scores.shape[1])
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(scores, top, axis=1)
+            best_rows = np.take_along_axis(rows, top, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        return ([[ids[row] for row in rows] for rows in best_rows],
+                best_scores.tolist())
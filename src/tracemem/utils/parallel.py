@@ -0,0 +1,75 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Sequence
+import asyncio
+import contextvars
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ParallelTaskError(Exception):
+    """Raised after a parallel map finished with one or more failed items."""
+
+    def __init__(self, errors: Dict[int, Exception], results: List[Any]):
+        self.errors = errors
+        self.results = results
+        details = "; ".join(f"#{idx}: {type(e).__name__}: {e}" for idx, e in sorted(errors.items()))
+        super().__init__(f"{len(errors)}/{len(results)} tasks failed ({details})")
+
+
+def ordered_map(func: Callable[[Any], Any],
+                items: Sequence[Any],
+                max_workers: int = 1) -> List[Any]:
+    """
+    Apply func to every item on a thread pool and return results in input order.
+
+    All items run to completion; per-item errors are collected and raised
+    together as a ParallelTaskError (failed slots hold None in `results`).
+    """
+    items = list(items)
+    results: List[Any] = [None] * len(items)
+    errors: Dict[int, Exception] = {}
+
+    if max_workers <= 1 or len(items) <= 1:
+        for idx, item in enumerate(items):
+            try:
+                results[idx] = func(item)
+            except Exception as e:
+                errors[idx] = e
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+            # each task runs in a copy of the caller's context (keeps trace span nesting)
+            futures = [executor.submit(contextvars.copy_context().run, func, item) for item in items]
+            for idx, future in enumerate(futures):
+                try:
+                    results[idx] = future.result()
+                except Exception as e:
+                    errors[idx] = e
+
+    if errors:
+        for idx, e in sorted(errors.items()):
+            logger.error(f"Task {idx} failed: {type(e).__name__}: {e}")
+        raise ParallelTaskError(errors, results) from next(iter(errors.values()))
+    return results
+
+
+async def aordered_map(func: Callable[[Any], Awaitable[Any]],
+                       items: Sequence[Any],
+                       max_workers: int = 1) -> List[Any]:
+    """Asyncio counterpart of ordered_map, concurrency bounded by a semaphore."""
+    items = list(items)
+    semaphore = asyncio.Semaphore(max(1, max_workers))
+
+    async def _run(item):
+        async with semaphore:
+            return await func(item)
+
+    outcomes = await asyncio.gather(*(_run(item) for item in items), return_exceptions=True)
+    errors = {idx: outcome for idx, outcome in enumerate(outcomes) if isinstance(outcome, Exception)}
+    results = [None if idx in errors else outcome for idx, outcome in enumerate(outcomes)]
+
+    if errors:
+        for idx, e in sorted(errors.items()):
+            logger.error(f"Task {idx} failed: {type(e).__name__}: {e}")
+        raise ParallelTaskError(errors, results) from next(iter(errors.values()))
+    return results
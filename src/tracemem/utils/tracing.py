@@ -0,0 +1,195 @@
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+import asyncio
+import atexit
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+
+import logging
+logger = logging.getLogger(__name__)
+
+TRACE_FORMATS = ("jsonl", "chrome")
+
+# process-wide tracer, None while tracing is disabled
+_TRACER: Optional["Tracer"] = None
+_TRACER_LOCK = threading.Lock()
+_CURRENT_SPAN: ContextVar[Optional[int]] = ContextVar("tracemem_current_span", default=None)
+
+
+class Tracer:
+    """
+    Append-only span sink.
+
+    "jsonl" writes one span object per line. "chrome" writes complete ("X")
+    events in the trace_event JSON array format, which chrome://tracing and
+    Perfetto accept without the closing bracket, so spans can be streamed.
+    """
+
+    def __init__(self, path: str, fmt: str = "jsonl"):
+        if fmt not in TRACE_FORMATS:
+            raise ValueError(f"Unknown trace format {fmt!r}, expected one of {TRACE_FORMATS}")
+        self.path = path
+        self.format = fmt
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        if fmt == "chrome" and self._file.tell() == 0:
+            self._file.write("[\n")
+
+    def next_id(self) -> int:
+        return next(self._ids)
+
+    def record(self,
+               name: str,
+               span_id: int,
+               parent_id: Optional[int],
+               start: float,
+               duration: float,
+               attrs: Dict[str, Any],
+               error: Optional[str] = None) -> None:
+        thread = threading.current_thread()
+        if self.format == "chrome":
+            args = dict(attrs, span_id=span_id, parent_id=parent_id)
+            if error is not None:
+                args["error"] = error
+            event = {"name": name, "cat": "tracemem", "ph": "X",
+                     "ts": round(start * 1e6, 3), "dur": round(duration * 1e6, 3),
+                     "pid": self._pid, "tid": thread.ident, "args": args}
+            line = json.dumps(event, ensure_ascii=False, default=str) + ",\n"
+        else:
+            event = {"name": name, "span_id": span_id, "parent_id": parent_id,
+                     "thread_id": thread.ident, "thread_name": thread.name,
+                     "start": start, "duration": duration, "attrs": attrs, "error": error}
+            line = json.dumps(event, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line)
+                # root spans close a unit of work, make it visible to readers
+                if parent_id is None:
+                    self._file.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "attrs", "span_id", "parent_id", "start", "_token")
+
+    def __init__(self, tracer: Tracer, name: str, attrs: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.span_id = self.tracer.next_id()
+        self.parent_id = _CURRENT_SPAN.get()
+        self._token = _CURRENT_SPAN.set(self.span_id)
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.time() - self.start
+        _CURRENT_SPAN.reset(self._token)
+        error = f"{exc_type.__name__}: {exc}" if exc_type is not None else None
+        self.tracer.record(self.name, self.span_id, self.parent_id, self.start, duration, self.attrs, error)
+        return False
+
+
+class _NullSpan:
+    """Returned by span() while tracing is disabled"""
+
+    def set(self, **attrs) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+def enable_tracing(path: str, fmt: str = "jsonl") -> Tracer:
+    """Start recording spans to `path`; re-enabling with the same sink is a no-op"""
+    global _TRACER
+    with _TRACER_LOCK:
+        if _TRACER is not None:
+            if (_TRACER.path, _TRACER.format) == (path, fmt):
+                return _TRACER
+            _TRACER.close()
+        _TRACER = Tracer(path, fmt)
+        logger.info(f"Tracing enabled ({fmt}) -> {path}")
+        return _TRACER
+
+
+def disable_tracing() -> None:
+    global _TRACER
+    with _TRACER_LOCK:
+        if _TRACER is not None:
+            _TRACER.close()
+        _TRACER = None
+
+
+def get_tracer() -> Optional[Tracer]:
+    return _TRACER
+
+
+def span(name: str, **attrs):
+    """Context manager timing a block; a shared no-op object when tracing is off"""
+    tracer = _TRACER
+    if tracer is None:
+        return NULL_SPAN
+    return _Span(tracer, name, attrs)
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """Decorator wrapping every call of a function (sync or async) in a span"""
+
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                tracer = _TRACER
+                if tracer is None:
+                    return await func(*args, **kwargs)
+                with _Span(tracer, span_name, {}):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            tracer = _TRACER
+            if tracer is None:
+                return func(*args, **kwargs)
+            with _Span(tracer, span_name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+@atexit.register
+def _close_tracer() -> None:
+    tracer = _TRACER
+    if tracer is not None:
+        tracer.close()